@@ -1,7 +1,10 @@
 import re
+import collections
+import itertools
 from cassandra import InvalidRequest, Unavailable, ConsistencyLevel, WriteTimeout, ReadTimeout
 from cassandra.query import SimpleStatement
 from tools import rows_to_list
+from datahelp import partition_key_columns
 
 def assert_unavailable(fun, *args):
     try:
@@ -45,6 +48,34 @@ def assert_all(cursor, query, expected, cl=ConsistencyLevel.ONE):
     list_res = rows_to_list(res)
     assert list_res == expected, "Expected %s from %s, but got %s" % (expected, query, list_res)
 
+def _stream_rows(cursor, query, cl, fetch_size):
+    simple_query = SimpleStatement(query, consistency_level=cl, fetch_size=fetch_size)
+    for row in cursor.execute(simple_query):
+        yield list(row)
+
+def assert_all_streaming(cursor, query, expected, cl=ConsistencyLevel.ONE, fetch_size=1000):
+    """
+    Like assert_all, but pages through the result fetch_size rows at a time and
+    compares it row by row with expected, which can be any iterable (e.g. a
+    generator). Stops at the first mismatch, reporting the row index and page.
+    """
+    sentinel = object()
+    actual = _stream_rows(cursor, query, cl, fetch_size)
+    for i, (row, expected_row) in enumerate(itertools.izip_longest(actual, expected, fillvalue=sentinel)):
+        if row != expected_row:
+            where = "row %d (page %d, fetch size %d)" % (i, i // fetch_size + 1, fetch_size)
+            if row is sentinel:
+                assert False, "Expected %s at %s from %s, but the result ended" % (expected_row, where, query)
+            if expected_row is sentinel:
+                assert False, "Expected the result of %s to end at %s, but got %s" % (query, where, row)
+            assert False, "Expected %s at %s from %s, but got %s" % (expected_row, where, query, row)
+
+def assert_one_streaming(cursor, query, expected, cl=ConsistencyLevel.ONE):
+    assert_all_streaming(cursor, query, [expected], cl=cl, fetch_size=2)
+
+def assert_none_streaming(cursor, query, cl=ConsistencyLevel.ONE):
+    assert_all_streaming(cursor, query, [], cl=cl, fetch_size=1)
+
 def assert_almost_equal(*args, **kwargs):
     try:
         error = kwargs['error']
@@ -64,3 +95,119 @@ def assert_row_count(cursor, table_name, expected):
     assert count == expected, "Expected a row count of {} in table '{}', but got {}".format(
         expected, table_name, count
     )
+
+# token bounds, as (exclusive min, inclusive max), of the partitioners that hash keys
+TOKEN_RANGES = {
+    'org.apache.cassandra.dht.Murmur3Partitioner': (-2**63, 2**63 - 1),
+    'org.apache.cassandra.dht.RandomPartitioner': (-1, 2**127),
+}
+
+def count_rows(cursor, table_name, splits=16, cl=ConsistencyLevel.ONE, fetch_size=5000):
+    """
+    Counts the rows of table_name client-side, paging through one token range
+    split at a time, so that big tables neither time out like count(*) does
+    nor get loaded in memory. Tables of other partitioners are counted in a
+    single paged scan.
+    """
+    pk = ', '.join(partition_key_columns(cursor, table_name))
+    bounds = TOKEN_RANGES.get(cursor.cluster.metadata.partitioner)
+    if bounds is None:
+        queries = ["SELECT {} FROM {}".format(pk, table_name)]
+    else:
+        low, high = bounds
+        step = (high - low) // splits
+        limits = [low + i * step for i in xrange(splits)] + [high]
+        queries = ["SELECT token({pk}) FROM {table} WHERE token({pk}) > {start} AND token({pk}) <= {end}".format(
+                   pk=pk, table=table_name, start=start, end=end) for start, end in zip(limits, limits[1:])]
+
+    count = 0
+    for query in queries:
+        for row in cursor.execute(SimpleStatement(query, consistency_level=cl, fetch_size=fetch_size)):
+            count += 1
+    return count
+
+def assert_row_count_streaming(cursor, table_name, expected, splits=16, cl=ConsistencyLevel.ONE):
+    """ Like assert_row_count, but counting rows client-side with count_rows """
+
+    count = count_rows(cursor, table_name, splits=splits, cl=cl)
+    assert count == expected, "Expected a row count of {} in table '{}', but got {}".format(
+        expected, table_name, count
+    )
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_hashable(v) for v in value)
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+def _row_keys(rows, columns):
+    """
+    Yields each row as a hashable tuple. Dict rows are laid out in columns
+    order, which defaults to the sorted keys of the first row.
+    """
+    for row in rows:
+        if isinstance(row, dict):
+            if columns is None:
+                columns = sorted(row.keys())
+            key = tuple([row.get(c) for c in columns])
+        else:
+            key = tuple(row)
+        try:
+            hash(key)
+        except TypeError:
+            # collection columns
+            key = tuple(_hashable(v) for v in key)
+        yield key
+
+def rows_difference(actual, expected, columns=None):
+    """
+    Compares two iterables of rows (dicts or sequences) as multisets. Each side
+    is iterated once; only the distinct expected rows are kept in memory.
+
+    Returns (missing, unexpected), two collections.Counter of row tuples:
+    the rows of expected not found in actual, and the rows of actual not
+    found in expected.
+    """
+    missing = collections.Counter()
+    for key in _row_keys(expected, columns):
+        missing[key] += 1
+
+    unexpected = collections.Counter()
+    for key in _row_keys(actual, columns):
+        if missing[key] > 1:
+            missing[key] -= 1
+        elif missing[key] == 1:
+            del missing[key]
+        else:
+            unexpected[key] += 1
+
+    return missing, unexpected
+
+def _describe_difference(missing, unexpected, max_diff):
+    msg = []
+    for label, diff in (('missing', missing), ('unexpected', unexpected)):
+        if diff:
+            shown = list(itertools.islice(diff.elements(), max_diff))
+            msg.append("%d %s rows, first ones: %s" % (sum(diff.values()), label, shown))
+    return '; '.join(msg)
+
+def assert_rows_equal_ignore_order(actual, expected, columns=None, max_diff=10):
+    """
+    Asserts that actual and expected hold the same rows, with the same number
+    of duplicates, in any order. Rows may be dicts or sequences and either side
+    may be any iterable, e.g. a generator. Reports at most max_diff rows of each kind.
+    """
+    missing, unexpected = rows_difference(actual, expected, columns)
+    assert not missing and not unexpected, _describe_difference(missing, unexpected, max_diff)
+
+def assert_rows_subset(subset, superset, columns=None, max_diff=10):
+    """
+    Asserts that every row of subset is in superset (as many times as it is
+    in subset), see assert_rows_equal_ignore_order.
+    """
+    missing, unexpected = rows_difference(subset, superset, columns)
+    assert not unexpected, _describe_difference(collections.Counter(), unexpected, max_diff)
@@ -432,8 +432,8 @@ class TestAuth(Tester):
         cassandra.execute("CREATE TABLE ks.cf (id int primary key, val int)")
 
         cathy = self.get_cursor(user='cathy', password='12345')
-        # another user to make sure the cache is at user level
-        cathy2 = self.get_cursor(user='cathy', password='12345')
+        # another connection to make sure the cache is at user level
+        cathy2 = self.patient_cql_connection(self.cluster.nodelist()[0], version="3.0.1", user='cathy', password='12345')
         cathys = [cathy, cathy2]
 
         self.assertUnauthorized("User cathy has no SELECT permission on <table ks.cf> or any of its parents",
@@ -596,7 +596,7 @@ class TestAuth(Tester):
         self.cluster.populate(nodes).start(no_wait=True)
         # default user setup is delayed by 10 seconds to reduce log spam
         if nodes == 1:
-            self.cluster.nodelist()[0].watch_log_for('Created default superuser')
+            self.log_watcher.wait_for(self.cluster.nodelist()[0], 'Created default superuser')
         else:
             # can' just watch for log - the line will appear in just one of the nodes' logs
             # only one test uses more than 1 node, though, so some sleep is fine.
@@ -604,7 +604,7 @@ class TestAuth(Tester):
 
     def get_cursor(self, node_idx=0, user=None, password=None):
         node = self.cluster.nodelist()[node_idx]
-        conn = self.patient_cql_connection(node, version="3.0.1", user=user, password=password)
+        conn = self.cached_cql_connection(node, version="3.0.1", user=user, password=password)
         return conn
 
     def assertPermissionsListed(self, expected, cursor, query):
@@ -1,6 +1,6 @@
 import random, time
 from dtest import debug, Tester
-from tools import new_node, insert_c1c2, query_c1c2
+from tools import new_node, insert_c1c2_range, query_c1c2, quick_stress
 from assertions import assert_almost_equal
 from ccmlib.cluster import Cluster
 from cassandra import ConsistencyLevel
@@ -45,8 +45,7 @@ class TestBootstrap(Tester):
         self.create_ks(session, 'ks', 1)
         self.create_cf(session, 'cf', columns={ 'c1' : 'text', 'c2' : 'text' })
 
-        for n in xrange(0, keys):
-            insert_c1c2(session, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, keys), ConsistencyLevel.ONE))
 
         node1.flush()
         initial_size = get_size(node1)
@@ -79,19 +78,14 @@ class TestBootstrap(Tester):
         """Test bootstrapped node sees existing data, eg. CASSANDRA-6648"""
         cluster = self.cluster
         cluster.populate(3)
-        version = cluster.version()
         cluster.start()
 
         node1 = cluster.nodes['node1']
-        if version < "2.1":
-            node1.stress(['-n', '10000'])
-        else:
-            node1.stress(['write', 'n=10000', '-rate', 'threads=8'])
+        quick_stress(node1, n=10000)
 
         node4 = new_node(cluster)
         node4.start()
 
         session = self.patient_cql_connection(node4)
-        stress_table = 'keyspace1.standard1' if self.cluster.version() >= '2.1' else '"Keyspace1"."Standard1"'
-        rows = session.execute('select * from %s limit 10' % stress_table)
+        rows = session.execute('select * from keyspace1.standard1 limit 10')
         assert len(list(rows)) == 10
@@ -126,7 +126,7 @@ class TestCompaction(Tester):
         node1.nodetool('setcompactionthroughput -- ' + threshold)
         node1.nodetool('compact')
 
-        matches = node1.watch_log_for("Compacted")
+        matches = self.log_watcher.wait_for(node1, "Compacted")
 
         stringline = matches[0]
         avgthroughput = stringline[stringline.find('=')+1:stringline.find("MB/s")]
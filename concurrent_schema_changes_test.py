@@ -1,7 +1,7 @@
 import time, os, pprint, glob, re
 from threading import Thread
 
-from dtest import debug, Tester
+from dtest import debug, Tester, wait_for_gossip_normal, wait_for_schema_agreement
 from ccmlib.node import Node
 
 def wait(delay=2):
@@ -139,7 +139,7 @@ class TestConcurrentSchemaChanges(Tester):
         cluster = self.cluster
         cluster.populate(2).start()
         [node1, node2] = cluster.nodelist()
-        wait(2)
+        wait_for_gossip_normal(cluster)
         cursor = self.cql_connection(node1)
         self.prepare_for_changes(cursor, namespace='ns1')
         self.make_schema_changes(cursor, namespace='ns1')
@@ -147,7 +147,7 @@ class TestConcurrentSchemaChanges(Tester):
         self.validate_schema_consistent(node1)
 
         # wait for changes to get to the first node
-        wait(20)
+        wait_for_schema_agreement(node2)
 
         cursor = self.cql_connection(node2)
         self.prepare_for_changes(cursor, namespace='ns2')
@@ -168,7 +168,7 @@ class TestConcurrentSchemaChanges(Tester):
         cluster = self.cluster
         cluster.populate(2).start()
         [node1, node2] = cluster.nodelist()
-        wait(2)
+        wait_for_gossip_normal(cluster)
         cursor = self.patient_cql_connection(node2)
 
         self.prepare_for_changes(cursor, namespace='ns2')
@@ -180,7 +180,8 @@ class TestConcurrentSchemaChanges(Tester):
         wait(2)
         node1.start()
         node2.start()
-        wait(20)
+        wait_for_gossip_normal(cluster)
+        wait_for_schema_agreement(node1)
         self.validate_schema_consistent(node1)
 
 
@@ -196,7 +197,7 @@ class TestConcurrentSchemaChanges(Tester):
         cluster = self.cluster
         cluster.populate(2).start()
         [node1, node2] = cluster.nodelist()
-        wait(2)
+        wait_for_gossip_normal(cluster)
         cursor = self.patient_cql_connection(node2)
 
         self.prepare_for_changes(cursor, namespace='ns2')
@@ -208,7 +209,8 @@ class TestConcurrentSchemaChanges(Tester):
         wait(2)
         node1.start()
         node2.start()
-        wait(20)
+        wait_for_gossip_normal(cluster)
+        wait_for_schema_agreement(node1)
         self.validate_schema_consistent(node1)
 
 
@@ -3,7 +3,7 @@ import time
 from dtest import Tester, debug, DISABLE_VNODES
 from assertions import assert_unavailable
 from tools import (create_c1c2_table, insert_c1c2, query_c1c2, retry_till_success,
-                   insert_columns)
+                   insert_columns, insert_c1c2_range, query_c1c2_range)
 from cassandra import ConsistencyLevel
 from cassandra.query import SimpleStatement
 
@@ -12,7 +12,7 @@ class TestConsistency(Tester):
     def cl_cl_prepare(self, write_cl, read_cl):
         cluster = self.cluster
 
-        cluster.populate(3).start()
+        cluster = self.populate_cluster(3)
         node1, node2, node3 = cluster.nodelist()
 
         session = self.patient_cql_connection(node1)
@@ -22,9 +22,8 @@ class TestConsistency(Tester):
         session2 = self.patient_cql_connection(node2, 'ks')
 
         # insert and get at CL.QUORUM
-        for n in xrange(0, 100):
-            insert_c1c2(session, n, write_cl)
-            query_c1c2(session2, n, read_cl)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, 100), write_cl))
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), read_cl))
 
         return session, session2
 
@@ -33,9 +32,8 @@ class TestConsistency(Tester):
 
         #Stop a node and retest
         self.cluster.nodelist()[2].stop()
-        for n in xrange(0, 100):
-            insert_c1c2(session, n, ConsistencyLevel.QUORUM)
-            query_c1c2(session2, n, ConsistencyLevel.QUORUM)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, 100), ConsistencyLevel.QUORUM))
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), ConsistencyLevel.QUORUM))
 
         self.cluster.nodelist()[1].stop()
         assert_unavailable(insert_c1c2, session, 100, ConsistencyLevel.QUORUM)
@@ -51,31 +49,27 @@ class TestConsistency(Tester):
 
         #Stop a node and retest
         self.cluster.nodelist()[2].stop()
-        for n in xrange(0, 100):
-            insert_c1c2(session, n, ConsistencyLevel.ONE)
-            query_c1c2(session2, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, 100), ConsistencyLevel.ONE))
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), ConsistencyLevel.ONE))
 
 
         #Stop a node and retest
         self.cluster.nodelist()[1].stop()
-        for n in xrange(0, 100):
-            insert_c1c2(session, n, ConsistencyLevel.ONE)
-            query_c1c2(session2, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, 100), ConsistencyLevel.ONE))
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), ConsistencyLevel.ONE))
 
     def one_all_test(self):
         session, session2 = self.cl_cl_prepare(ConsistencyLevel.ONE, ConsistencyLevel.ALL)
 
         #Stop a node and retest
         self.cluster.nodelist()[2].stop()
-        for n in xrange(0, 100):
-            insert_c1c2(session, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, 100), ConsistencyLevel.ONE))
         assert_unavailable(query_c1c2, session2, 100, ConsistencyLevel.ALL)
 
 
         #Stop a node and retest
         self.cluster.nodelist()[1].stop()
-        for n in xrange(0, 100):
-            insert_c1c2(session, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, 100), ConsistencyLevel.ONE))
         assert_unavailable(query_c1c2, session2, 100, ConsistencyLevel.ALL)
 
     def all_one_test(self):
@@ -84,23 +78,20 @@ class TestConsistency(Tester):
         #Stop a node and retest
         self.cluster.nodelist()[2].stop()
         assert_unavailable(insert_c1c2, session, 100, ConsistencyLevel.ALL)
-        for n in xrange(0, 100):
-            query_c1c2(session2, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), ConsistencyLevel.ONE))
 
         #Stop a node and retest
         self.cluster.nodelist()[1].stop()
         assert_unavailable(insert_c1c2, session, 100, ConsistencyLevel.ALL)
-        for n in xrange(0, 100):
-            query_c1c2(session2, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), ConsistencyLevel.ONE))
 
     def quorum_two_test(self):
         session, session2 = self.cl_cl_prepare(ConsistencyLevel.QUORUM, ConsistencyLevel.TWO)
 
         #Stop a node and retest
         self.cluster.nodelist()[2].stop()
-        for n in xrange(0, 100):
-            insert_c1c2(session, n, ConsistencyLevel.QUORUM)
-            query_c1c2(session2, n, ConsistencyLevel.TWO)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, 100), ConsistencyLevel.QUORUM))
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), ConsistencyLevel.TWO))
 
         self.cluster.nodelist()[1].stop()
         assert_unavailable(insert_c1c2, session, 100, ConsistencyLevel.QUORUM)
@@ -111,8 +102,7 @@ class TestConsistency(Tester):
 
         #Stop a node and retest
         self.cluster.nodelist()[2].stop()
-        for n in xrange(0, 100):
-            insert_c1c2(session, n, ConsistencyLevel.QUORUM)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, 100), ConsistencyLevel.QUORUM))
         assert_unavailable(query_c1c2, session2, 100, ConsistencyLevel.THREE)
 
         self.cluster.nodelist()[1].stop()
@@ -124,9 +114,8 @@ class TestConsistency(Tester):
 
         #Stop a node and retest
         self.cluster.nodelist()[2].stop()
-        for n in xrange(0, 100):
-            insert_c1c2(session, n, ConsistencyLevel.TWO)
-            query_c1c2(session2, n, ConsistencyLevel.TWO)
+        self.assertEqual({}, insert_c1c2_range(session, xrange(0, 100), ConsistencyLevel.TWO))
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), ConsistencyLevel.TWO))
 
         self.cluster.nodelist()[1].stop()
         assert_unavailable(insert_c1c2, session, 100, ConsistencyLevel.TWO)
@@ -138,14 +127,12 @@ class TestConsistency(Tester):
         #Stop a node and retest
         self.cluster.nodelist()[2].stop()
         assert_unavailable(insert_c1c2, session, 100, ConsistencyLevel.THREE)
-        for n in xrange(0, 100):
-            query_c1c2(session2, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), ConsistencyLevel.ONE))
 
         #Stop a node and retest
         self.cluster.nodelist()[1].stop()
         assert_unavailable(insert_c1c2, session, 100, ConsistencyLevel.THREE)
-        for n in xrange(0, 100):
-            query_c1c2(session2, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, query_c1c2_range(session2, xrange(0, 100), ConsistencyLevel.ONE))
 
     def short_read_test(self):
         cluster = self.cluster
@@ -228,19 +215,17 @@ class TestConsistency(Tester):
 
         node2.stop(wait_other_notice=True)
 
-        for n in xrange(0, 100):
-            insert_c1c2(cursor, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, insert_c1c2_range(cursor, xrange(0, 100), ConsistencyLevel.ONE))
 
-        log_mark = node1.mark_log()
+        log_mark = self.log_watcher.mark(node1)
         node2.start()
-        node1.watch_log_for(["Finished hinted"], from_mark=log_mark, timeout=120)
+        self.log_watcher.wait_for(node1, ["Finished hinted"], from_mark=log_mark, timeout=120)
 
         node1.stop(wait_other_notice=True)
 
         # Check node2 for all the keys that should have been delivered via HH
         cursor = self.patient_cql_connection(node2, keyspace='ks')
-        for n in xrange(0, 100):
-            query_c1c2(cursor, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, query_c1c2_range(cursor, xrange(0, 100), ConsistencyLevel.ONE))
 
     def readrepair_test(self):
         cluster = self.cluster
@@ -259,21 +244,18 @@ class TestConsistency(Tester):
 
         node2.stop(wait_other_notice=True)
 
-        for n in xrange(0, 10000):
-            insert_c1c2(cursor, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, insert_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.ONE))
 
         node2.start(wait_other_notice=True)
 
        # query everything to cause RR
-        for n in xrange(0, 10000):
-            query_c1c2(cursor, n, ConsistencyLevel.QUORUM)
+        self.assertEqual({}, query_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.QUORUM))
 
         node1.stop(wait_other_notice=True)
 
         # Check node2 for all the keys that should have been repaired
         cursor = self.patient_cql_connection(node2, keyspace='ks')
-        for n in xrange(0, 10000):
-            query_c1c2(cursor, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, query_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.ONE))
 
     def short_read_reversed_test(self):
         cluster = self.cluster
@@ -326,15 +308,13 @@ class TestConsistency(Tester):
         create_c1c2_table(self, cursor)
 
         debug("Generating some data")
-        for n in xrange(100):
-            insert_c1c2(cursor, n, CL)
+        self.assertEqual({}, insert_c1c2_range(cursor, xrange(100), CL))
 
         debug("Taking down node1")
         node1.stop(wait_other_notice=True)
 
         debug("Reading back data.")
-        for n in xrange(100):
-            query_c1c2(cursor, n, CL)
+        self.assertEqual({}, query_c1c2_range(cursor, xrange(100), CL))
 
     def stop_delete_and_restart(self, node_number, column):
         to_stop = self.cluster.nodes["node%d" % node_number]
@@ -12,7 +12,7 @@ class TestCounters(Tester):
         """ Simple incrementation test (Created for #3465, that wasn't a bug) """
         cluster = self.cluster
 
-        cluster.populate(3).start()
+        cluster = self.populate_cluster(3)
         nodes = cluster.nodelist()
 
         cursor = self.patient_cql_connection(nodes[0])
@@ -68,7 +68,7 @@ class TestCounters(Tester):
         updates = 50
 
         def make_updates():
-            cursor = self.patient_cql_connection(nodes[0], keyspace='ks', version=cql_version)
+            cursor = self.cached_cql_connection(nodes[0], keyspace='ks', version=cql_version)
             upd = "UPDATE counterTable SET c = c + 1 WHERE k = %d;"
             batch = " ".join(["BEGIN COUNTER BATCH"] + [upd % x for x in keys] + ["APPLY BATCH;"])
 
@@ -78,7 +78,7 @@ class TestCounters(Tester):
                 cursor.execute(query)
 
         def check(i):
-            cursor = self.patient_cql_connection(nodes[0], keyspace='ks', version=cql_version)
+            cursor = self.cached_cql_connection(nodes[0], keyspace='ks', version=cql_version)
             query = SimpleStatement("SELECT * FROM counterTable", consistency_level=ConsistencyLevel.QUORUM)
             rows = cursor.execute(query)
 
@@ -114,7 +114,7 @@ class TestCounters(Tester):
         Do a bunch of writes with ONE, read back with ALL and check results.
         """
         cluster = self.cluster
-        cluster.populate(3).start()
+        cluster = self.populate_cluster(3)
         node1, node2, node3 = cluster.nodelist()
         cursor = self.patient_cql_connection(node1)
         self.create_ks(cursor, 'counter_tests', 3)
@@ -195,7 +195,7 @@ class TestCounters(Tester):
         Test for singlular update statements that will affect multiple counters.
         """
         cluster = self.cluster
-        cluster.populate(3).start()
+        cluster = self.populate_cluster(3)
         node1, node2, node3 = cluster.nodelist()
         cursor = self.patient_cql_connection(node1)
         self.create_ks(cursor, 'counter_tests', 3)
@@ -232,7 +232,7 @@ class TestCounters(Tester):
 
     def validate_empty_column_name_test(self):
         cluster = self.cluster
-        cluster.populate(1).start()
+        cluster = self.populate_cluster(1)
         node1 = cluster.nodelist()[0]
         cursor = self.patient_cql_connection(node1)
         self.create_ks(cursor, 'counter_tests', 1)
@@ -258,7 +258,7 @@ class TestCounters(Tester):
     def drop_counter_column_test(self):
         """Test for CASSANDRA-7831"""
         cluster = self.cluster
-        cluster.populate(1).start()
+        cluster = self.populate_cluster(1)
         node1, = cluster.nodelist()
         session = self.patient_cql_connection(node1)
         self.create_ks(session, 'counter_tests', 1)
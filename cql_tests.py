@@ -29,7 +29,7 @@ class TestCQL(Tester):
             cluster.set_configuration_options(values={'row_cache_size_in_mb': 100})
 
         if not cluster.nodelist():
-            cluster.populate(nodes).start()
+            cluster = self.populate_cluster(nodes)
         node1 = cluster.nodelist()[0]
         time.sleep(0.2)
 
@@ -21,7 +21,7 @@ class TestCqlsh(Tester):
         self.cluster.start()
 
         node1, = self.cluster.nodelist()
-        node1.watch_log_for('thrift clients...')# We need to delay for the node to startup on windows
+        self.log_watcher.wait_for(node1, 'thrift clients...')# We need to delay for the node to startup on windows
 
         node1.run_cqlsh(cmds = """
             CREATE KEYSPACE simple WITH replication = {'class': 'SimpleStrategy', 'replication_factor': 1};
@@ -45,7 +45,7 @@ class TestCqlsh(Tester):
         self.cluster.start()
 
         node1, = self.cluster.nodelist()
-        node1.watch_log_for('thrift clients...')# We need to delay for the node to startup on windows
+        self.log_watcher.wait_for(node1, 'thrift clients...')# We need to delay for the node to startup on windows
 
         node1.run_cqlsh(cmds = u"""create KEYSPACE testks WITH replication = {'class': 'SimpleStrategy', 'replication_factor': 1};
 use testks;
@@ -289,7 +289,7 @@ UPDATE varcharmaptable SET varcharvarintmap['Vitrum edere possum, mihi non nocet
         self.cluster.start()
 
         node1, = self.cluster.nodelist()
-        node1.watch_log_for('thrift clients...')# We need to delay for the node to startup on windows
+        self.log_watcher.wait_for(node1, 'thrift clients...')# We need to delay for the node to startup on windows
 
         node1.run_cqlsh(cmds = u"""create keyspace  CASSANDRA_7196 WITH replication = {'class': 'SimpleStrategy', 'replication_factor': 1} ;
 
@@ -368,7 +368,7 @@ VALUES (4, blobAsInt(0x), '', blobAsBigint(0x), 0x, blobAsBoolean(0x), blobAsDec
         self.cluster.populate(1).start()
 
         node1, = self.cluster.nodelist()
-        node1.watch_log_for('thrift clients...')
+        self.log_watcher.wait_for(node1, 'thrift clients...')
 
         session = self.patient_cql_connection(node1)
 
@@ -430,7 +430,7 @@ VALUES (4, blobAsInt(0x), '', blobAsBigint(0x), 0x, blobAsBoolean(0x), blobAsDec
         self.cluster.populate(1)
         self.cluster.start()
         node1, = self.cluster.nodelist()
-        node1.watch_log_for('Created default superuser')
+        self.log_watcher.wait_for(node1, 'Created default superuser')
 
         conn = self.patient_cql_connection(node1, user='cassandra', password='cassandra')
         conn.execute("CREATE KEYSPACE ks WITH replication = {'class':'SimpleStrategy', 'replication_factor':1}")
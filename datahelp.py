@@ -1,5 +1,10 @@
 import re
+import threading
+import time
 from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.query import BatchStatement, BatchType
+
+from dtest import debug
 
 
 def strip(val):
@@ -21,13 +26,54 @@ def parse_headers_into_list(data):
     return headers
 
 
+_ROW_MULTIPLIER = re.compile(r'\*(\d+)$')
+
+
+class RowBuilder(object):
+    """
+    Turns data rows of a table literal into dicts. The format function of
+    each column is looked up once, and each literal row is split and stripped
+    once however many times it is repeated; copies only recompute the cells
+    that have a format function.
+    """
+
+    def __init__(self, headers, format_funcs=None):
+        self.headers = headers
+        self.format_funcs = format_funcs or {}
+        self._formatted = [(h, self.format_funcs[h]) for h in headers if self.format_funcs.get(h) is not None]
+
+    def split(self, row):
+        """
+        Returns (multiplier, raw cell values by column name) for a row,
+        the multiplier being None if the row has no *1234 prefix.
+        """
+        row_cells = [l.strip() for l in row.split('|')]
+        m = _ROW_MULTIPLIER.search(row_cells[0])
+
+        if m:
+            return int(m.group(1)), dict(zip(self.headers, row_cells[1:]))
+
+        return None, dict(zip(self.headers, row_cells))
+
+    def rows(self, row):
+        """Yields the dict(s) described by row."""
+        row_multiplier, raw = self.split(row)
+        formatted = [(h, func) for h, func in self._formatted if h in raw]
+
+        for i in xrange(row_multiplier or 1):
+            row_map = raw.copy()
+            for colname, func in formatted:
+                row_map[colname] = func(raw[colname])
+            yield row_map
+
+
 def get_row_multiplier(row):
     # find prefix like *1234 meaning create 1,234 rows
     row_cells = [l.strip() for l in row.split('|')]
-    m = re.findall('\*(\d+)$', row_cells[0])
+    m = _ROW_MULTIPLIER.search(row_cells[0])
 
     if m:
-        return int(m[0])
+        return int(m.group(1))
 
     return None
 
@@ -40,52 +86,159 @@ def row_has_multiplier(row):
 
 
 def parse_row_into_dict(row, headers, format_funcs=None):
-    row_cells = [l.strip() for l in row.split('|')]
+    builder = RowBuilder(headers, format_funcs=format_funcs)
+    row_multiplier, _ = builder.split(row)
+    multirows = list(builder.rows(row))
 
-    if row_has_multiplier(row):
-        row_multiplier = get_row_multiplier(row)
-        row = '|'.join(row_cells[1:])  # cram remainder of row back into foo|bar format
-        multirows = []
-
-        for i in range(row_multiplier):
-            multirows.append(
-                parse_row_into_dict(row, headers, format_funcs=format_funcs)
-            )
+    if row_multiplier is not None:
         return multirows
 
-    row_map = dict(zip(headers, row_cells))
-
-    if format_funcs:
-        for colname, value in row_map.items():
-            func = format_funcs.get(colname)
-
-            if func is not None:
-                row_map[colname] = func(value)
-
-    return row_map
+    return multirows[0]
 
 
-def parse_data_into_dicts(data, format_funcs=None):
+def _data_rows(data):
     # throw out leading/trailing space and pipes
     # so we can split on the data without getting
     # extra empty fields
     rows = map(strip, data.split('\n'))
 
     # remove any remaining empty lines (i.e. '') from data
-    rows = filter(None, rows)
+    return filter(None, rows)
 
-    # remove headers
-    headers = parse_headers_into_list(rows.pop(0))
 
-    values = []
+def parse_data_into_dicts(data, format_funcs=None):
+    return list(iter_data_dicts(data, format_funcs=format_funcs))
+
+
+def iter_data_dicts(data, format_funcs=None):
+    """
+    Like parse_data_into_dicts, but yields the row dicts one at a time,
+    so rows from a multiplier (e.g. *100000) are never all in memory.
+    """
+    rows = _data_rows(data)
+    builder = RowBuilder(parse_headers_into_list(rows.pop(0)), format_funcs=format_funcs)
 
     for row in rows:
-        if row_has_multiplier(row):
-            values.extend(parse_row_into_dict(row, headers, format_funcs=format_funcs))
-        else:
-            values.append(parse_row_into_dict(row, headers, format_funcs=format_funcs))
+        for row_map in builder.rows(row):
+            yield row_map
 
-    return values
+
+class LoadStats(object):
+    """
+    What load_rows did: rows written, batches sent, failed batches as
+    (batch, exception) pairs, and elapsed seconds.
+    """
+
+    def __init__(self, rows, batches, failures, elapsed):
+        self.rows = rows
+        self.batches = batches
+        self.failures = failures
+        self.elapsed = elapsed
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else float(self.rows)
+
+    def __str__(self):
+        return "%d rows in %d batches (%d failed) in %.2fs, %.0f rows/s" % (
+            self.rows, self.batches, len(self.failures), self.elapsed, self.rows_per_second)
+
+
+def partition_key_columns(cursor, table_name):
+    keyspace, _, table = table_name.rpartition('.')
+    table_meta = cursor.cluster.metadata.keyspaces[keyspace or cursor.keyspace].tables[table]
+    return [col.name for col in table_meta.partition_key]
+
+
+def execute_bounded(cursor, statements, concurrency):
+    """
+    Executes statements, consumed lazily, with at most concurrency requests
+    in flight at a time. Returns the list of (statement, exception) failures.
+    """
+    in_flight = threading.Semaphore(concurrency)
+    failures = []
+
+    def on_error(exc, statement):
+        failures.append((statement, exc))
+        in_flight.release()
+
+    for statement in statements:
+        in_flight.acquire()
+        future = cursor.execute_async(statement)
+        future.add_callbacks(callback=lambda _: in_flight.release(),
+                             errback=on_error, errback_args=(statement,))
+
+    # wait for the stragglers
+    for i in xrange(concurrency):
+        in_flight.acquire()
+    return failures
+
+
+def load_rows(data, cursor, table_name, cl=None, format_funcs=None, partition_key=None,
+              batch_size=100, concurrency=50, prefix='', postfix='', raise_on_failure=True):
+    """
+    Writes the rows described by data (same format as for create_rows) without
+    keeping them: multiplied rows are generated lazily, rows of a same partition
+    are grouped in unlogged batches of up to batch_size rows, and at most
+    concurrency batches are in flight. Batches carry their partition's routing
+    key, so a session using TokenAwarePolicy sends them straight to a replica.
+
+    partition_key lists the partition key columns, read from the schema
+    if not given.
+
+    Once every batch has been sent, raises the exception of the first failed
+    batch, like create_rows does, unless raise_on_failure is False.
+
+    Use create_rows instead when the written rows are needed for comparisons.
+    Returns a LoadStats.
+    """
+    headers = parse_headers_into_list(data)
+    if partition_key is None:
+        partition_key = partition_key_columns(cursor, table_name)
+
+    prepared = cursor.prepare(
+        "{prefix} INSERT INTO {table} ({cols}) values ({vals}) {postfix}".format(
+            prefix=prefix, table=table_name, cols=', '.join(headers),
+            vals=', '.join('?' for h in headers), postfix=postfix)
+    )
+    counts = {'rows': 0, 'batches': 0}
+
+    def batches():
+        # group rows by partition over windows of rows, so memory stays bounded
+        window = batch_size * concurrency
+        partitions = {}
+        for i, row in enumerate(iter_data_dicts(data, format_funcs=format_funcs), 1):
+            key = tuple(row[col] for col in partition_key)
+            partitions.setdefault(key, []).append(row)
+            if i % window == 0:
+                for batch in make_batches(partitions):
+                    yield batch
+                partitions = {}
+        for batch in make_batches(partitions):
+            yield batch
+
+    def make_batches(partitions):
+        for rows in partitions.itervalues():
+            for start in xrange(0, len(rows), batch_size):
+                batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+                if cl is not None:
+                    batch.consistency_level = cl
+                batch_rows = rows[start:start + batch_size]
+                for row in batch_rows:
+                    bound = prepared.bind([row[h] for h in headers])
+                    batch.add(bound)
+                batch.routing_key = bound.routing_key
+                counts['rows'] += len(batch_rows)
+                counts['batches'] += 1
+                yield batch
+
+    start_time = time.time()
+    failures = execute_bounded(cursor, batches(), concurrency)
+    stats = LoadStats(counts['rows'], counts['batches'], failures, time.time() - start_time)
+    debug("load_rows into %s: %s" % (table_name, stats))
+    if failures and raise_on_failure:
+        raise failures[0][1]
+    return stats
 
 
 def create_rows(data, cursor, table_name, cl=None, format_funcs=None, prefix='', postfix=''):
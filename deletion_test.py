@@ -1,4 +1,4 @@
-from dtest import Tester
+from dtest import Tester, wait_for_compactions
 
 import os, sys, time
 from ccmlib.cluster import Cluster
@@ -30,9 +30,10 @@ class TestDeletion(Tester):
             assert len(result) == 2 and len(result[0]) == 1 and len(result[1]) == 1, result
 
         node1.flush()
+        # the tombstones have to be older than gc_grace (0s), to the second
         time.sleep(.5)
         node1.compact()
-        time.sleep(.5)
+        wait_for_compactions(node1)
 
         result = cursor.execute('select * from cf;')
         assert len(result) == 1 and len(result[0]) == 2, result
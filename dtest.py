@@ -1,13 +1,22 @@
 from __future__ import with_statement
-import os, tempfile, sys, shutil, subprocess, types, time, threading, traceback, ConfigParser, logging, fnmatch, re, copy
+import os, tempfile, sys, shutil, subprocess, types, time, threading, traceback, ConfigParser, logging, fnmatch, re, copy, atexit, json, hashlib, socket, struct
+
+try:
+    import fcntl
+except ImportError:
+    # no flock on windows, parallel clusters are not supported there
+    fcntl = None
 
 from ccmlib.cluster import Cluster
 from ccmlib.cluster_factory import ClusterFactory
-from ccmlib.node import Node
-from ccmlib.common import is_win
+from ccmlib.node import Node, TimeoutError
+from ccmlib.common import is_win, get_version_from_build
+from distutils.version import LooseVersion
 from uuid import UUID
+from collections import OrderedDict, deque
 from nose.exc import SkipTest
 from unittest import TestCase
+from cassandra import ConsistencyLevel
 from cassandra.cluster import NoHostAvailable
 from cassandra.cluster import Cluster as PyCluster
 from cassandra.auth import PlainTextAuthProvider
@@ -24,10 +33,14 @@ LAST_LOG = os.path.join(LOG_SAVED_DIR, "last")
 LAST_TEST_DIR='last_test_dir'
 
 DEFAULT_DIR='./'
+TEMPLATE_DIR=os.environ.get('TEMPLATE_DIR', '~/.cassandra-dtest-templates')
 config = ConfigParser.RawConfigParser()
 if len(config.read(os.path.expanduser('~/.cassandra-dtest'))) > 0:
     if config.has_option('main', 'default_dir'):
         DEFAULT_DIR=os.path.expanduser(config.get('main', 'default_dir'))
+    if config.has_option('main', 'template_dir') and 'TEMPLATE_DIR' not in os.environ:
+        TEMPLATE_DIR=config.get('main', 'template_dir')
+TEMPLATE_DIR=os.path.expanduser(TEMPLATE_DIR)
 
 NO_SKIP = os.environ.get('SKIP', '').lower() in ('no', 'false')
 DEBUG = os.environ.get('DEBUG', '').lower() in ('yes', 'true')
@@ -41,10 +54,23 @@ NUM_TOKENS = os.environ.get('NUM_TOKENS', '256')
 RECORD_COVERAGE = os.environ.get('RECORD_COVERAGE', '').lower() in ('yes', 'true')
 REUSE_CLUSTER = os.environ.get('REUSE_CLUSTER', '').lower() in ('yes', 'true')
 SILENCE_DRIVER_ON_SHUTDOWN = os.environ.get('SILENCE_DRIVER_ON_SHUTDOWN', 'true').lower() in ('yes', 'true')
+PARALLEL_CLUSTERS = os.environ.get('PARALLEL_CLUSTERS', '').lower() in ('yes', 'true')
+MAX_PARALLEL_CLUSTERS = int(os.environ.get('MAX_PARALLEL_CLUSTERS', '16'))
+LEASE_DIR = os.environ.get('LEASE_DIR', tempfile.gettempdir())
+CLUSTER_POOL = os.environ.get('CLUSTER_POOL', '').lower() in ('yes', 'true')
+CLUSTER_POOL_SIZE = int(os.environ.get('CLUSTER_POOL_SIZE', '2'))
+CLUSTER_TEMPLATES = os.environ.get('CLUSTER_TEMPLATES', '').lower() in ('yes', 'true')
+INSTRUMENT_SESSIONS = os.environ.get('INSTRUMENT_SESSIONS', '').lower() in ('yes', 'true')
+SESSION_STATS_FILE = os.path.join(LOG_SAVED_DIR, 'session_stats.json')
+
+SYSTEM_KEYSPACES = ('system', 'system_auth', 'system_traces', 'system_distributed', 'system_schema')
 
 
 CURRENT_TEST = ""
 
+# seconds spent in wait_until() by this process
+WAIT_TIME = 0.0
+
 logging.basicConfig(filename=os.path.join(LOG_SAVED_DIR,"dtest.log"),
                     filemode='w',
                     format='%(asctime)s,%(msecs)d %(name)s %(current_test)s %(levelname)s %(message)s',
@@ -81,9 +107,337 @@ def retry_till_success(fun, *args, **kwargs):
                 # brief pause before next attempt
                 time.sleep(0.25)
 
+def wait_until(predicate, timeout=60, msg=None, initial_delay=0.05, max_delay=2):
+    """
+    Calls predicate until it returns a true value, which is then returned,
+    doubling the pause between calls up to max_delay. Raises TimeoutError if
+    that doesn't happen within timeout seconds.
+    """
+    global WAIT_TIME
+    start = time.time()
+    deadline = start + timeout
+    delay = initial_delay
+    try:
+        while True:
+            result = predicate()
+            if result:
+                return result
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(msg or "%s not met after %s seconds" % (getattr(predicate, '__name__', predicate), timeout))
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+    finally:
+        WAIT_TIME += time.time() - start
+
+def schema_agrees(node):
+    """True if node sees a single schema version among all reachable nodes (nodetool describecluster)."""
+    out = node.nodetool('describecluster', True)[0]
+    versions = out.split('Schema versions:')[1]
+    return len([v for v in re.findall(r'^\s*(\S+): \[', versions, re.M) if v != 'UNREACHABLE']) == 1
+
+def gossip_normal(cluster):
+    """True if every running node sees every running node as Up/Normal (nodetool status)."""
+    running = [node for node in cluster.nodelist() if node.is_running()]
+    for node in running:
+        out = node.nodetool('status', True)[0]
+        states = dict((address, state) for state, address in re.findall(r'^([UD][NLJM])\s+(\S+)', out, re.M))
+        if any(states.get(other.address()) != 'UN' for other in running):
+            return False
+    return True
+
+def thread_pool_stats(node):
+    """Returns {pool name: (active, pending)} from nodetool tpstats."""
+    out = node.nodetool('tpstats', True)[0]
+    return dict((name, (int(active), int(pending)))
+                for name, active, pending in re.findall(r'^(\w+)\s+(\d+)\s+(\d+)', out, re.M))
+
+def _pools_idle(node, pools):
+    return all(active == 0 and pending == 0
+               for name, (active, pending) in thread_pool_stats(node).items() if name in pools)
+
+def compactions_done(node):
+    """True if node has no running nor pending compaction (nodetool compactionstats)."""
+    out = node.nodetool('compactionstats', True)[0]
+    pending = re.search(r'pending tasks: (\d+)', out)
+    return pending is not None and int(pending.group(1)) == 0 and 'compaction type' not in out.lower()
+
+def flushes_done(node):
+    return _pools_idle(node, ('FlushWriter', 'MemtableFlushWriter', 'MemtablePostFlusher', 'MemtablePostFlush'))
+
+# a protocol v1 OPTIONS request on stream 0; every native protocol version
+# answers it (with SUPPORTED, or an ERROR if v1 is not supported) once the
+# native transport is up
+OPTIONS_FRAME = struct.pack('>BBbBi', 0x01, 0x00, 0, 0x05, 0)
+
+def native_transport_ready(address, probe_timeout=1):
+    """True if something answers a native protocol OPTIONS request on
+    address, a (host, port) pair."""
+    try:
+        s = socket.create_connection(address, probe_timeout)
+    except socket.error:
+        return False
+    try:
+        s.settimeout(probe_timeout)
+        s.sendall(OPTIONS_FRAME)
+        header = s.recv(8)
+        # the high bit of the version byte marks a response
+        return len(header) > 0 and ord(header[0]) & 0x80 != 0
+    except socket.error:
+        return False
+    finally:
+        s.close()
+
+def wait_for_schema_agreement(node, timeout=60):
+    return wait_until(lambda: schema_agrees(node), timeout, "no schema agreement seen by %s" % node.name)
+
+def wait_for_gossip_normal(cluster, timeout=60):
+    return wait_until(lambda: gossip_normal(cluster), timeout, "nodes are not all Up/Normal")
+
+def wait_for_compactions(node, timeout=120):
+    return wait_until(lambda: compactions_done(node), timeout, "compactions still running on %s" % node.name)
+
+def wait_for_flushes(node, timeout=60):
+    return wait_until(lambda: flushes_done(node), timeout, "flushes still running on %s" % node.name)
+
+def wait_for_native_transport(node, timeout=60):
+    """Waits for node to answer on its native protocol port and returns how
+    many seconds that took. Returns right away for nodes with no native
+    transport."""
+    start = time.time()
+    if node.network_interfaces.get('binary'):
+        wait_until(lambda: native_transport_ready(node.network_interfaces['binary']), timeout,
+                   "native transport of %s not answering" % node.name, max_delay=1)
+    return time.time() - start
+
 def is_win():
     return True if sys.platform == "cygwin" or sys.platform == "win32" else False
 
+# (CASSANDRA_VERSION, CASSANDRA_DIR) -> LooseVersion or None
+_CASSANDRA_VERSIONS = {}
+
+def cassandra_version():
+    """
+    The version of Cassandra that tests run against, as a LooseVersion,
+    from CASSANDRA_VERSION or else from the build in CASSANDRA_DIR, without
+    creating a cluster. None if that can't be told before ccm fetches the
+    sources (e.g. CASSANDRA_VERSION=git:trunk). Resolved once per process
+    for each value of those variables.
+    """
+    version = os.environ.get('CASSANDRA_VERSION')
+    cdir = os.environ.get('CASSANDRA_DIR', DEFAULT_DIR)
+    key = (version, cdir)
+    if key not in _CASSANDRA_VERSIONS:
+        _CASSANDRA_VERSIONS[key] = _resolve_cassandra_version(version, cdir)
+    return _CASSANDRA_VERSIONS[key]
+
+def _resolve_cassandra_version(version, cdir):
+    if version:
+        match = re.match(r'^(?:binary:)?(\d+\.\d+.*)$', version)
+        return LooseVersion(match.group(1)) if match else None
+    try:
+        return LooseVersion(get_version_from_build(cdir))
+    except Exception as e:
+        debug("Could not read the Cassandra version in %s: %s" % (cdir, e))
+        return None
+
+class ClusterLease(object):
+    """
+    A block of loopback addresses (127.0.<slot>.x) and JMX/remote debug ports
+    reserved for the clusters of one test process.
+
+    Slot 0 is the historical 127.0.0.x layout with JMX on 7x00. When
+    PARALLEL_CLUSTERS is set, each process (e.g. a worker of
+    nosetests --processes=N) claims a free slot by taking an exclusive flock
+    on LEASE_DIR/dtest-lease-<slot>.lock; the lock goes away with the process,
+    so a crashed worker never leaks its slot.
+
+    Tests that hardcode 127.0.0.x addresses still have to run serially.
+    """
+
+    def __init__(self, slot, lock_file=None):
+        self.slot = slot
+        self._lock_file = lock_file
+
+    @classmethod
+    def acquire(cls):
+        if not PARALLEL_CLUSTERS or fcntl is None:
+            return cls(0)
+
+        for slot in xrange(MAX_PARALLEL_CLUSTERS):
+            lock_file = open(os.path.join(LEASE_DIR, 'dtest-lease-%d.lock' % slot), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                lock_file.close()
+                continue
+            # record the owner, only for the benefit of whoever looks at the lock files
+            lock_file.truncate(0)
+            lock_file.write('%d\n' % os.getpid())
+            lock_file.flush()
+            debug("leased loopback block 127.0.%d.x (pid %d)" % (slot, os.getpid()))
+            return cls(slot, lock_file)
+
+        raise RuntimeError("All %d cluster leases in %s are taken" % (MAX_PARALLEL_CLUSTERS, LEASE_DIR))
+
+    def release(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def ipprefix(self):
+        return '127.0.%d.' % self.slot
+
+    def address(self, i):
+        return self.ipprefix + str(i)
+
+    def jmx_port(self, i):
+        if self.slot == 0:
+            return str(7000 + i * 100)
+        return str(10000 + self.slot * 1000 + i * 10)
+
+    def remote_debug_port(self, i):
+        if self.slot == 0:
+            return str(2000 + i * 100)
+        return str(10500 + self.slot * 1000 + i * 10)
+
+    @property
+    def last_test_dir(self):
+        if self.slot == 0:
+            return LAST_TEST_DIR
+        return '%s.%d' % (LAST_TEST_DIR, self.slot)
+
+    @property
+    def pooled_clusters(self):
+        """where the ClusterPool of this slot records its clusters"""
+        return self.last_test_dir + '.pooled'
+
+_cluster_lease = None
+
+def cluster_lease():
+    """Returns the ClusterLease of this process, acquiring it on first use."""
+    global _cluster_lease
+    if _cluster_lease is None:
+        _cluster_lease = ClusterLease.acquire()
+    return _cluster_lease
+
+def destroy_cluster(cluster, test_path):
+    _forget_logs(test_path)
+    if KEEP_TEST_DIR:
+        cluster.stop(gently=RECORD_COVERAGE)
+    else:
+        # when recording coverage the jvm has to exit normally
+        # or the coverage information is not written by the jacoco agent
+        # otherwise we can just kill the process
+        if RECORD_COVERAGE:
+            cluster.stop(gently=True)
+
+        # Cleanup everything:
+        debug("removing ccm cluster " + cluster.name + " at: " + test_path)
+        cluster.remove()
+        os.rmdir(test_path)
+
+class ClusterPool(object):
+    """
+    Running clusters kept between tests (and test classes) of this process, keyed
+    by topology and configuration, see Tester.populate_cluster(). At most
+    `size` clusters are kept; the least recently used one is removed first.
+
+    The pooled clusters are recorded in the lease's pooled_clusters file, so
+    that if the process dies with clusters in the pool, the next process on
+    the same lease removes them in remove_leftovers().
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._clusters = OrderedDict()
+        self._leftovers_removed = False
+
+    def checkout(self, key):
+        """Returns a (cluster, test_path) pair and removes it from the pool, or None."""
+        pooled = self._clusters.pop(key, None)
+        self._record()
+        return pooled
+
+    def checkin(self, key, cluster, test_path):
+        if key in self._clusters:
+            destroy_cluster(*self._clusters.pop(key))
+        self._clusters[key] = (cluster, test_path)
+        while len(self._clusters) > self.size:
+            _, evicted = self._clusters.popitem(last=False)
+            debug("evicting pooled cluster at " + evicted[1])
+            destroy_cluster(*evicted)
+        self._record()
+
+    def clear(self):
+        # runs at exit, where a run that never pooled a cluster may not
+        # hold a lease, and shouldn't take one
+        if not self._clusters:
+            return
+        while self._clusters:
+            _, (cluster, test_path) = self._clusters.popitem()
+            try:
+                destroy_cluster(cluster, test_path)
+            except Exception as e:
+                debug("Error removing pooled cluster at %s: %s" % (test_path, e))
+        self._record()
+
+    def _record(self):
+        path = cluster_lease().pooled_clusters
+        if self._clusters:
+            with open(path, 'w') as f:
+                json.dump([[test_path, cluster.name] for cluster, test_path in self._clusters.values()], f)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def remove_leftovers(self):
+        """
+        Removes the clusters that a process which died on this lease left
+        pooled. Only the first call does anything, as after it the recorded
+        clusters are this process' own.
+        """
+        if self._leftovers_removed:
+            return
+        self._leftovers_removed = True
+        path = cluster_lease().pooled_clusters
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            leftovers = json.load(f)
+        for test_path, name in leftovers:
+            try:
+                destroy_cluster(ClusterFactory.load(test_path, name), test_path)
+            except Exception as e:
+                # e.g. /tmp was emptied by a restart
+                debug("Could not remove leftover pooled cluster at %s: %s" % (test_path, e))
+        os.remove(path)
+
+cluster_pool = ClusterPool(CLUSTER_POOL_SIZE)
+atexit.register(cluster_pool.clear)
+
+def save_cluster_template(cluster, template):
+    """
+    Copies the directory of a stopped cluster to `template`, leaving the node
+    logs behind. The copy is made next to the template and renamed into place,
+    so concurrent runs never see a partial template.
+    """
+    if not os.path.exists(TEMPLATE_DIR):
+        os.makedirs(TEMPLATE_DIR)
+    staging_dir = tempfile.mkdtemp(prefix='tmp-', dir=TEMPLATE_DIR)
+    try:
+        staging = os.path.join(staging_dir, cluster.name)
+        shutil.copytree(cluster.get_path(), staging,
+                        ignore=lambda d, names: names if os.path.basename(d) == 'logs' else [])
+        try:
+            os.rename(staging, template)
+        except OSError:
+            # another run saved the same template first
+            pass
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
 class Runner(threading.Thread):
     def __init__(self, func):
         threading.Thread.__init__(self)
@@ -115,6 +469,365 @@ class Runner(threading.Thread):
             raise self.__error
 
 
+# log file path -> TailedLog, kept for as long as the cluster is, so that a
+# pooled or reused cluster's logs are never read again from the start
+_TAILED_LOGS = {}
+
+def _forget_logs(test_path):
+    prefix = os.path.join(test_path, '')
+    for path in [p for p in _TAILED_LOGS if p.startswith(prefix)]:
+        del _TAILED_LOGS[path]
+
+class TailedLog(object):
+    """
+    Incremental reader for one log file. Only the bytes appended since the
+    last read() are read; the ERROR lines and the most recent lines are kept.
+    """
+
+    def __init__(self, path, history):
+        self.path = path
+        self.errors = []
+        self.recent = deque(maxlen=history)
+        self.line_end = 0  # offset right after the last complete line read
+        self.history_start = 0
+        self._inode = None
+        self._partial = ''
+
+    def read(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self.line_end + len(self._partial):
+            # new or rotated file, start over on it
+            self._inode = stat.st_ino
+            self.recent.clear()
+            self.line_end = self.history_start = 0
+            self._partial = ''
+
+        offset = self.line_end + len(self._partial)
+        if stat.st_size == offset:
+            return
+        with open(self.path) as f:
+            f.seek(offset)
+            lines = (self._partial + f.read(stat.st_size - offset)).split('\n')
+        self._partial = lines.pop()
+
+        for line in lines:
+            self.line_end += len(line) + 1
+            if 'ERROR' in line:
+                self.errors.append(line)
+            self.recent.append((self.line_end, line))
+
+        if self.recent:
+            oldest_end, oldest = self.recent[0]
+            self.history_start = oldest_end - len(oldest) - 1
+        else:
+            self.history_start = self.line_end
+
+    def lines_after(self, position):
+        """Yields (end offset, line) for every complete line ending after position."""
+        if position < self.history_start:
+            # too old to still be in memory, read just the missing part
+            with open(self.path) as f:
+                f.seek(position)
+                missing = f.read(self.history_start - position)
+            for line in missing.split('\n')[:-1]:
+                position += len(line) + 1
+                yield position, line
+        for end, line in list(self.recent):
+            if end > position:
+                yield end, line
+
+
+class LogWatcher(threading.Thread):
+    """
+    Tails the log of every node of a cluster from a background thread, so that
+    tearDown's ERROR check and wait_for() never rescan whole log files.
+
+    get_nodes is called on every poll, so nodes added after the watcher started
+    are picked up too. Logs are tailed from where an earlier watcher left
+    them, and errors() only returns the ERROR lines logged since this
+    watcher was created.
+    """
+
+    def __init__(self, get_nodes, interval=0.1, history=10000):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._get_nodes = get_nodes
+        self._interval = interval
+        self._history = history
+        # log file path -> number of its ERROR lines that predate this watcher,
+        # e.g. those of the earlier tests on a pooled cluster
+        self._error_marks = {}
+        for path, log in _TAILED_LOGS.items():
+            log.read()
+            self._error_marks[path] = len(log.errors)
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def run(self):
+        while not self._stopped:
+            self.poll()
+            time.sleep(self._interval)
+
+    def stop(self):
+        """Stops the watcher, after reading whatever was logged up to now."""
+        self._stopped = True
+        if self.is_alive():
+            self.join()
+        self.poll()
+
+    def poll(self):
+        with self._cond:
+            for node in self._get_nodes():
+                self._log(node).read()
+            self._cond.notify_all()
+
+    def _log(self, node):
+        path = node.logfilename()
+        log = _TAILED_LOGS.get(path)
+        if log is None:
+            log = _TAILED_LOGS[path] = TailedLog(path, self._history)
+        self._error_marks.setdefault(path, 0)
+        return log
+
+    def errors(self, node):
+        """Returns the ERROR lines logged by node since this watcher was created."""
+        with self._cond:
+            log = self._log(node)
+            return log.errors[self._error_marks[log.path]:]
+
+    def mark(self, node):
+        """Returns a position in node's log to be passed to wait_for()."""
+        with self._cond:
+            log = self._log(node)
+            log.read()
+            return log.line_end
+
+    def wait_for(self, node, exprs, from_mark=None, timeout=600):
+        """
+        Waits for lines matching each of exprs to show up in node's log after
+        from_mark, a position from mark(), or anywhere in it if from_mark is
+        None. Like Node.watch_log_for, returns a (line, match) pair for a
+        single expression and a list of them otherwise, or raises TimeoutError.
+        """
+        single = isinstance(exprs, basestring)
+        tofind = [re.compile(e) for e in ([exprs] if single else exprs)]
+        found = []
+        deadline = time.time() + timeout
+        with self._cond:
+            log = self._log(node)
+            log.read()
+            position = from_mark or 0
+            while True:
+                for position, line in log.lines_after(position):
+                    for e in list(tofind):
+                        m = e.search(line)
+                        if m:
+                            found.append((line, m))
+                            tofind.remove(e)
+                    if not tofind:
+                        return found[0] if single else found
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(time.strftime("%d %b %Y %H:%M:%S", time.gmtime()) +
+                                       " [" + node.name + "] Missing: " + str([e.pattern for e in tofind]))
+                self._cond.wait(remaining)
+
+
+class LatencyHistogram(object):
+    """
+    Latency histogram in the manner of HdrHistogram: values are kept in
+    microseconds, in log-linear buckets with 2**(SUB_BUCKET_BITS - 1) buckets
+    per power of two. Any recorded value is reported to within 1% of what
+    was recorded, whatever its magnitude, in a few hundred buckets at most.
+
+    Safe to record into from several threads.
+    """
+
+    SUB_BUCKET_BITS = 7
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _bucket(self, value):
+        magnitude = max(0, value.bit_length() - LatencyHistogram.SUB_BUCKET_BITS)
+        return (magnitude, value >> magnitude)
+
+    def _highest_equivalent(self, bucket):
+        magnitude, sub_bucket = bucket
+        return ((sub_bucket + 1) << magnitude) - 1
+
+    def record(self, seconds, count=1):
+        """ records count occurrences of a latency of seconds """
+        value = int(seconds * 1000000)
+        bucket = self._bucket(value)
+        with self._lock:
+            self._counts[bucket] = self._counts.get(bucket, 0) + count
+            self.count += count
+            self.total += value * count
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = max(self.max, value)
+
+    def merge(self, other):
+        """ adds every value recorded in other to this histogram """
+        with other._lock:
+            counts = other._counts.items()
+            total, low, high = other.total, other.min, other.max
+        with self._lock:
+            for bucket, count in counts:
+                self._counts[bucket] = self._counts.get(bucket, 0) + count
+                self.count += count
+            self.total += total
+            if low is not None:
+                self.min = low if self.min is None else min(self.min, low)
+            self.max = max(self.max, high)
+        return self
+
+    def percentile(self, percentile):
+        """ returns the latency, in seconds, under which percentile % of the values fall """
+        with self._lock:
+            if not self.count:
+                return 0.0
+            threshold = max(1, self.count * percentile / 100.0)
+            seen = 0
+            for bucket in sorted(self._counts):
+                seen += self._counts[bucket]
+                if seen >= threshold:
+                    return min(self._highest_equivalent(bucket), self.max) / 1000000.0
+            return self.max / 1000000.0
+
+    def mean(self):
+        if not self.count:
+            return 0.0
+        return self.total / float(self.count) / 1000000.0
+
+    def to_dict(self):
+        """ a summary of the histogram, in milliseconds, for JSON """
+        return {
+            'count': self.count,
+            'mean': self.mean() * 1000,
+            'min': (self.min or 0) / 1000.0,
+            'p50': self.percentile(50) * 1000,
+            'p95': self.percentile(95) * 1000,
+            'p99': self.percentile(99) * 1000,
+            'max': self.max / 1000.0,
+        }
+
+    def __str__(self):
+        return "count=%d mean=%.2fms p50=%.2fms p95=%.2fms p99=%.2fms max=%.2fms" % (
+            self.count, self.mean() * 1000, self.percentile(50) * 1000,
+            self.percentile(95) * 1000, self.percentile(99) * 1000, self.max / 1000.0)
+
+
+class SessionStats(object):
+    """
+    Counts, errors and latencies of the statements sent through
+    InstrumentedSessions, per statement, consistency level and whether the
+    statement was prepared. Literals are stripped from statements, so that
+    queries formatted with different values are counted together.
+    """
+
+    LITERALS = re.compile(r"'(?:[^']|'')*'|\b0x[0-9a-fA-F]+\b|(?<![\w.])-?\d+(?:\.\d+)?\b")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (statement, prepared, consistency level) -> [count, errors, LatencyHistogram]
+        self._stats = {}
+
+    def record(self, statement, prepared, consistency_level, seconds, failed=False):
+        statement = ' '.join(SessionStats.LITERALS.sub('?', statement).split())
+        key = (statement, prepared, ConsistencyLevel.value_to_name.get(consistency_level, consistency_level))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0, LatencyHistogram()]
+            stats[0] += 1
+            if failed:
+                stats[1] += 1
+        stats[2].record(seconds)
+
+    def to_list(self):
+        with self._lock:
+            items = sorted(self._stats.items())
+        return [{'statement': statement, 'prepared': prepared, 'consistency_level': cl,
+                 'count': count, 'errors': errors, 'latency_ms': histogram.to_dict()}
+                for (statement, prepared, cl), (count, errors, histogram) in items]
+
+
+class InstrumentedSession(object):
+    """
+    Wraps a driver Session, recording every statement it executes in a
+    SessionStats. Anything else is passed through to the session.
+    """
+
+    def __init__(self, session, stats):
+        object.__setattr__(self, '_session', session)
+        object.__setattr__(self, '_stats', stats)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._session, name, value)
+
+    def _describe(self, query):
+        """returns the (statement, prepared, consistency level) of query"""
+        prepared = getattr(query, 'prepared_statement', None)
+        if prepared is None and hasattr(query, 'query_id'):
+            # a PreparedStatement executed as is
+            prepared = query
+        if prepared is not None:
+            statement, is_prepared = prepared.query_string, True
+        else:
+            statement, is_prepared = getattr(query, 'query_string', query), False
+        if not isinstance(statement, basestring):
+            # e.g. a BatchStatement
+            statement = type(query).__name__
+        consistency_level = getattr(query, 'consistency_level', None)
+        if consistency_level is None:
+            consistency_level = getattr(self._session, 'default_consistency_level', ConsistencyLevel.ONE)
+        return statement, is_prepared, consistency_level
+
+    def execute(self, query, *args, **kwargs):
+        start = time.time()
+        failed = True
+        try:
+            result = self._session.execute(query, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._record(query, time.time() - start, failed)
+
+    def _record(self, query, seconds, failed):
+        # stats must never get in the way of the statement's own result
+        try:
+            self._stats.record(*self._describe(query), seconds=seconds, failed=failed)
+        except Exception as e:
+            debug("Could not record session stats for %r: %s" % (query, e))
+
+    def execute_async(self, query, *args, **kwargs):
+        start = time.time()
+        future = self._session.execute_async(query, *args, **kwargs)
+        # callbacks run again for every page fetched, only the first one counts
+        recorded = []
+
+        def record(result, failed):
+            if not recorded:
+                recorded.append(True)
+                self._record(query, time.time() - start, failed)
+
+        future.add_callbacks(callback=record, callback_args=(False,),
+                             errback=record, errback_args=(True,))
+        return future
+
+
 class Tester(TestCase):
 
     def __init__(self, *argv, **kwargs):
@@ -151,28 +864,47 @@ class Tester(TestCase):
             if OFFHEAP_MEMTABLES:
                 cluster.set_configuration_options(values={'memtable_allocation_type': 'offheap_objects'})
 
+        self._apply_cluster_lease(cluster)
         return cluster
 
+    def _apply_cluster_lease(self, cluster):
+        """
+        Make cluster.populate() place nodes on this process' loopback block
+        and JMX/debug port range rather than on 127.0.0.x.
+        """
+        lease = cluster_lease()
+        if lease.slot == 0:
+            return
+
+        populate = cluster.populate
+
+        def leased_populate(nodes, *args, **kwargs):
+            kwargs.setdefault('ipprefix', lease.ipprefix)
+            existing = set(cluster.nodes.keys())
+            result = populate(nodes, *args, **kwargs)
+            for name, node in cluster.nodes.items():
+                if name in existing:
+                    continue
+                i = int(name[len('node'):])
+                node.jmx_port = lease.jmx_port(i)
+                if node.remote_debug_port != '0':
+                    node.remote_debug_port = lease.remote_debug_port(i)
+                # rewrite cassandra-env with the leased ports
+                node.import_config_files()
+                node._save()
+            return result
+
+        cluster.populate = leased_populate
+
     def _cleanup_cluster(self):
         if SILENCE_DRIVER_ON_SHUTDOWN:
             # driver logging is very verbose when nodes start going down -- bump up the level
             logging.getLogger('cassandra').setLevel(logging.CRITICAL)
 
-        if KEEP_TEST_DIR:
-            self.cluster.stop(gently=RECORD_COVERAGE)
-        else:
-            # when recording coverage the jvm has to exit normally
-            # or the coverage information is not written by the jacoco agent
-            # otherwise we can just kill the process
-            if RECORD_COVERAGE:
-                self.cluster.stop(gently=True)
-
-            # Cleanup everything:
-            debug("removing ccm cluster " + self.cluster.name + " at: " + self.test_path)
-            self.cluster.remove()
-            os.rmdir(self.test_path)
-        if os.path.exists(LAST_TEST_DIR):
-            os.remove(LAST_TEST_DIR)
+        destroy_cluster(self.cluster, self.test_path)
+        last_test_dir = cluster_lease().last_test_dir
+        if os.path.exists(last_test_dir):
+            os.remove(last_test_dir)
 
     def set_node_to_current_version(self, node):
         version = os.environ.get('CASSANDRA_VERSION')
@@ -189,8 +921,10 @@ class Tester(TestCase):
         # cleaning up if a previous execution didn't trigger tearDown (which
         # can happen if it is interrupted by KeyboardInterrupt)
         # TODO: move that part to a generic fixture
-        if os.path.exists(LAST_TEST_DIR):
-            with open(LAST_TEST_DIR) as f:
+        last_test_dir = cluster_lease().last_test_dir
+        cluster_pool.remove_leftovers()
+        if os.path.exists(last_test_dir):
+            with open(last_test_dir) as f:
                 self.test_path = f.readline().strip('\n')
                 name = f.readline()
             try:
@@ -220,15 +954,143 @@ class Tester(TestCase):
                 'request_timeout_in_ms' : timeout
             })
 
-        with open(LAST_TEST_DIR, 'w') as f:
-            f.write(self.test_path + '\n')
-            f.write(self.cluster.name)
+        self._record_test_dir()
         if DEBUG:
             self.cluster.set_log_level("DEBUG")
         if TRACE:
             self.cluster.set_log_level("TRACE")
         self.connections = []
+        self._session_cache = {}
         self.runners = []
+        self.session_stats = SessionStats()
+        self._timings = {'start': time.time(), 'wait_time': WAIT_TIME, 'populate_time': 0.0, 'ready_times': {}}
+        self._cluster_pool_spec = None
+        if getattr(self, 'log_watcher', None) is not None:
+            self.log_watcher.stop()
+        self.log_watcher = LogWatcher(lambda: self.cluster.nodelist())
+        self.log_watcher.start()
+
+    def _record_test_dir(self):
+        # remembered so that the next setUp can clean up if tearDown never runs
+        with open(cluster_lease().last_test_dir, 'w') as f:
+            f.write(self.test_path + '\n')
+            f.write(self.cluster.name)
+
+    def populate_cluster(self, nodes, **kwargs):
+        """
+        Populates and starts self.cluster, and returns it.
+
+        If CLUSTER_POOL is set, a running cluster with the same topology
+        (nodes and populate() arguments), partitioner and configuration left
+        by an earlier test is used instead, and the cluster is handed back to
+        the pool by tearDown if the test passes without changing it.
+        """
+        self._cluster_pool_spec = (nodes, kwargs)
+        key = self._populated_pool_key = self._cluster_pool_key()
+        pooled = cluster_pool.checkout(key) if CLUSTER_POOL else None
+        start = time.time()
+
+        if pooled is None and CLUSTER_TEMPLATES:
+            self._populate_from_template(nodes, kwargs)
+        elif pooled is None:
+            self.cluster.populate(nodes, **kwargs).start()
+        else:
+            debug("reusing pooled cluster at " + pooled[1])
+            # setUp's cluster was never populated, simply drop it
+            self.cluster.remove()
+            os.rmdir(self.test_path)
+            self.cluster, self.test_path = pooled
+            self._record_test_dir()
+        self._timings['populate_time'] += time.time() - start
+        return self.cluster
+
+    def _populate_from_template(self, nodes, kwargs):
+        """
+        Starts self.cluster from a copy of a template: a cluster of the same
+        topology and configuration that was started once and stopped cleanly.
+        The nodes come up on existing system tables, so bootstrap and first boot
+        token and schema setup are skipped. Creates the template if missing.
+        """
+        identity = json.dumps([self._cluster_pool_key(), self.cluster.get_install_dir(),
+                               self.cluster.version(), cluster_lease().slot])
+        template = os.path.join(TEMPLATE_DIR, hashlib.sha1(identity).hexdigest())
+
+        if os.path.exists(template):
+            debug("starting cluster from template " + template)
+            name = self.cluster.name
+            self.cluster.remove()
+            shutil.copytree(template, os.path.join(self.test_path, name))
+            self.cluster = ClusterFactory.load(self.test_path, name)
+            for node in self.cluster.nodelist():
+                # cassandra.yaml and the logging configuration still point to the template's original path
+                node.import_config_files()
+        else:
+            self.cluster.populate(nodes, **kwargs).start()
+            self.cluster.flush()
+            self.cluster.stop()
+            save_cluster_template(self.cluster, template)
+            debug("saved cluster template " + template)
+        self.cluster.start()
+
+    def _cluster_pool_key(self):
+        nodes, kwargs = self._cluster_pool_spec
+        return json.dumps([nodes, kwargs, self.cluster.partitioner, self.cluster._config_options],
+                          sort_keys=True, default=str)
+
+    def _return_cluster_to_pool(self):
+        """
+        Hands a cluster from populate_cluster() back to the pool, after dropping
+        all non-system keyspaces. Returns False if the cluster can't be pooled:
+        pooling is off, nodes were stopped, added or reconfigured by the test,
+        or it runs with authentication or authorization, whose users, roles
+        and permissions would leak into the next test.
+
+        The cluster is pooled under the key it was populated with, which
+        also has to be the key of its current configuration: options
+        changed after start are not what its nodes run with.
+        """
+        if not CLUSTER_POOL or self._cluster_pool_spec is None:
+            return False
+
+        nodes = self.cluster.nodelist()
+        expected_count = sum(self._cluster_pool_spec[0]) if isinstance(self._cluster_pool_spec[0], list) else self._cluster_pool_spec[0]
+        if len(nodes) != expected_count or not all(node.is_running() for node in nodes):
+            return False
+
+        key = self._populated_pool_key
+        if self._cluster_pool_key() != key:
+            debug("cluster can't be pooled, its configuration changed after populate_cluster()")
+            return False
+        options = self.cluster._config_options
+        for option, allow_all in (('authenticator', 'AllowAllAuthenticator'), ('authorizer', 'AllowAllAuthorizer')):
+            # either the class name or the fully qualified one
+            if options.get(option, allow_all).split('.')[-1] != allow_all:
+                debug("cluster can't be pooled, it runs with the %s %s" % (option, options[option]))
+                return False
+        try:
+            self._reset_cluster()
+        except Exception as e:
+            debug("cluster can't be pooled, reset failed: %s" % e)
+            return False
+
+        cluster_pool.checkin(key, self.cluster, self.test_path)
+        last_test_dir = cluster_lease().last_test_dir
+        if os.path.exists(last_test_dir):
+            os.remove(last_test_dir)
+        return True
+
+    def _reset_cluster(self):
+        session = self.cql_connection(self.cluster.nodelist()[0])
+        try:
+            keyspaces = session.cluster.metadata.keyspaces
+            for name in keyspaces.keys():
+                if name not in SYSTEM_KEYSPACES:
+                    session.execute('DROP KEYSPACE "%s"' % name)
+            if 'system_traces' in keyspaces:
+                for table in keyspaces['system_traces'].tables.keys():
+                    session.execute('TRUNCATE system_traces."%s"' % table)
+        finally:
+            session.cluster.shutdown()
 
     def copy_logs(self, directory=None, name=None):
         """Copy the current cluster's log files somewhere, by default to LOG_SAVED_DIR with a name of 'last'"""
@@ -253,7 +1115,7 @@ class Tester(TestCase):
                 os.symlink(basedir, name)
 
     def cql_connection(self, node, keyspace=None, version=None, user=None,
-        password=None, compression=True, protocol_version=None):
+        password=None, compression=True, protocol_version=None, load_balancing_policy=None):
 
         node_ip = self.get_ip_from_node(node)
 
@@ -266,11 +1128,13 @@ class Tester(TestCase):
                 protocol_version = 1
 
         if user is None:
-            cluster = PyCluster([node_ip], compression=compression, protocol_version=protocol_version)
+            cluster = PyCluster([node_ip], compression=compression, protocol_version=protocol_version, load_balancing_policy=load_balancing_policy)
         else:
             auth_provider=self.get_auth_provider(user=user, password=password)
-            cluster = PyCluster([node_ip], auth_provider=auth_provider, compression=compression, protocol_version=protocol_version)
+            cluster = PyCluster([node_ip], auth_provider=auth_provider, compression=compression, protocol_version=protocol_version, load_balancing_policy=load_balancing_policy)
         session = cluster.connect()
+        if INSTRUMENT_SESSIONS:
+            session = InstrumentedSession(session, self.session_stats)
         if keyspace is not None:
             session.execute('USE %s' % keyspace)
 
@@ -297,6 +1161,8 @@ class Tester(TestCase):
             auth_provider=self.get_auth_provider(user=user, password=password)
             cluster = PyCluster([node_ip], auth_provider=auth_provider, compression=compression, protocol_version=protocol_version, load_balancing_policy=wlrr)
         session = cluster.connect()
+        if INSTRUMENT_SESSIONS:
+            session = InstrumentedSession(session, self.session_stats)
         if keyspace is not None:
             session.execute('USE %s' % keyspace)
 
@@ -313,6 +1179,7 @@ class Tester(TestCase):
         """
         if is_win():
             timeout = timeout * 5
+        timeout = self._wait_for_native_transport(node, timeout)
 
         return retry_till_success(
             self.cql_connection,
@@ -337,6 +1204,7 @@ class Tester(TestCase):
         """
         if is_win():
             timeout = timeout * 5
+        timeout = self._wait_for_native_transport(node, timeout)
 
         return retry_till_success(
             self.exclusive_cql_connection,
@@ -351,6 +1219,66 @@ class Tester(TestCase):
             bypassed_exception=NoHostAvailable
         )
 
+    def _wait_for_native_transport(self, node, timeout):
+        """Probes node until its native transport answers, so that no driver
+        Cluster gets built and torn down while it can't, recording the time
+        it took. Returns what is left of timeout, which is what connecting
+        has left; if the node never answers, that is 0 and the patient
+        connection gets a single attempt to fail with the usual error."""
+        try:
+            ready_time = wait_for_native_transport(node, timeout)
+        except TimeoutError:
+            return 0
+        debug("%s ready after %.3fs" % (node.name, ready_time))
+        self._timings['ready_times'].setdefault(node.name, []).append(ready_time)
+        return timeout - ready_time
+
+    def cached_cql_connection(self, node, keyspace=None, version=None,
+        user=None, password=None, timeout=10, compression=True,
+        protocol_version=None, exclusive=False):
+        """
+        Like patient_cql_connection (or patient_exclusive_cql_connection if
+        exclusive), but hands back the session an earlier call with the same
+        node, version, credentials, protocol_version and compression opened,
+        if any.
+
+        Cached sessions are dropped as soon as any node of the cluster has
+        been stopped or (re)started since they were opened, so a test never
+        gets a session whose driver still has the old topology. As with
+        patient_cql_connection, the session is in keyspace, or in no
+        keyspace at all if that is None: a cached session that some caller
+        USEd a keyspace on is replaced then, as a keyspace can't be unset.
+        """
+        key = (node.name, version, user, password, protocol_version, compression, exclusive)
+        nodes_state = self._nodes_state()
+        cached = self._session_cache.get(key)
+        if cached is not None:
+            state, session = cached
+            if state == nodes_state and (keyspace is not None or session.keyspace is None):
+                if keyspace is not None and session.keyspace != keyspace:
+                    session.execute('USE %s' % keyspace)
+                return session
+            self._evict_session(key)
+
+        connect = self.patient_exclusive_cql_connection if exclusive else self.patient_cql_connection
+        session = connect(node, keyspace=keyspace, version=version, user=user, password=password,
+                          timeout=timeout, compression=compression, protocol_version=protocol_version)
+        self._session_cache[key] = (nodes_state, session)
+        return session
+
+    def _nodes_state(self):
+        # the pid of a node changes whenever ccm restarts it
+        return tuple((n.name, n.pid if n.is_running() else None) for n in self.cluster.nodelist())
+
+    def _evict_session(self, key):
+        state, session = self._session_cache.pop(key)
+        if session in self.connections:
+            self.connections.remove(session)
+        try:
+            session.cluster.shutdown()
+        except Exception as e:
+            debug("Error shutting down cached session: %s" % e)
+
     def create_ks(self, session, name, rf):
         query = 'CREATE KEYSPACE %s WITH replication={%s}'
         if isinstance(rf, types.IntType):
@@ -392,8 +1320,9 @@ class Tester(TestCase):
     @classmethod
     def tearDownClass(cls):
         reset_environment_vars()
-        if os.path.exists(LAST_TEST_DIR):
-            with open(LAST_TEST_DIR) as f:
+        last_test_dir = cluster_lease().last_test_dir
+        if os.path.exists(last_test_dir):
+            with open(last_test_dir) as f:
                 test_path = f.readline().strip('\n')
                 name = f.readline()
                 try:
@@ -404,7 +1333,7 @@ class Tester(TestCase):
                     else:
                         cluster.remove()
                         os.rmdir(test_path)
-                    os.remove(LAST_TEST_DIR)
+                    os.remove(last_test_dir)
                 except IOError:
                     # after a restart, /tmp will be emptied so we'll get an IOError when loading the old cluster here
                     pass
@@ -421,11 +1350,15 @@ class Tester(TestCase):
             except:
                 pass
 
+        if INSTRUMENT_SESSIONS:
+            self._write_session_stats()
+
         failed = sys.exc_info() != (None, None, None)
         try:
+            self.log_watcher.stop()
             for node in self.cluster.nodelist():
                 if self.allow_log_errors == False:
-                    errors = list(self.__filter_errors([ msg for msg, i in node.grep_log("ERROR")]))
+                    errors = list(self.__filter_errors(self.log_watcher.errors(node)))
                     if len(errors) is not 0:
                         failed = True
                         raise AssertionError('Unexpected error in %s node log: %s' % (node.name, errors))
@@ -437,10 +1370,27 @@ class Tester(TestCase):
             except Exception as e:
                     print "Error saving log:", str(e)
             finally:
-                if not self._preserve_cluster:
-                    self._cleanup_cluster()
-                elif self._preserve_cluster and failed:
-                    self._cleanup_cluster()
+                if failed or not self._return_cluster_to_pool():
+                    if not self._preserve_cluster or failed:
+                        self._cleanup_cluster()
+
+    def _write_session_stats(self):
+        """Appends what this test's sessions did, and how long the test
+        spent starting clusters and waiting, to SESSION_STATS_FILE as a line
+        of JSON."""
+        record = {
+            'test': self.id(),
+            'duration': time.time() - self._timings['start'],
+            'populate_time': self._timings['populate_time'],
+            'wait_time': WAIT_TIME - self._timings['wait_time'],
+            'ready_times': self._timings['ready_times'],
+            'statements': self.session_stats.to_list(),
+        }
+        try:
+            with open(SESSION_STATS_FILE, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except IOError as e:
+            debug("Could not write session stats: %s" % e)
 
     def go(self, func):
         runner = Runner(func)
@@ -555,7 +1505,7 @@ class MultiError(Exception):
         return output
 
 
-def run_scenarios(scenarios, handler, deferred_exceptions=tuple()):
+def run_scenarios(scenarios, handler, deferred_exceptions=tuple(), threads=1, name_prefix=None):
     """
     Runs multiple scenarios from within a single test method.
 
@@ -567,25 +1517,68 @@ def run_scenarios(scenarios, handler, deferred_exceptions=tuple()):
 
     Exceptions which occur will be bundled up and raised as a single MultiError exception, either when: a) all scenarios have run,
     or b) on the first exception encountered which is not whitelisted in deferred_exceptions.
-    """
-    errors = []
-    tracebacks = []
 
-    for i, scenario in enumerate(scenarios, 1):
-        debug("running scenario {}/{}: {}".format(i, len(scenarios), scenario))
+    With threads > 1, up to that many scenarios run at once, so handler must be thread-safe; on a non-deferrable exception no
+    new scenario is started, and the MultiError is raised once the running ones are done. Either way, exceptions are reported
+    in scenario order. With a name_prefix, handler(item, name) is called instead, name being name_prefix followed by the
+    scenario number, for scenarios to create their own keyspace or table and not step on each other. Scenarios that share
+    a keyspace or table without it are only safe to run in parallel if none of them writes to it.
 
+    Returns the number of seconds each scenario took, in scenario order.
+    """
+    scenarios = list(scenarios)
+    # scenario number -> (exception, traceback, deferrable)
+    failures = {}
+    timings = [None] * len(scenarios)
+    lock = threading.Lock()
+    numbers = iter(xrange(1, len(scenarios) + 1))
+
+    def run(i):
+        scenario = scenarios[i - 1]
+        debug("running scenario {}/{}: {}".format(i, len(scenarios), scenario))
+        start = time.time()
         try:
-            handler(scenario)
-        except deferred_exceptions as e:
-            tracebacks.append(traceback.format_exc(sys.exc_info()))
-            errors.append(type(e)('encountered {} {} running scenario:\n  {}\n'.format(e.__class__.__name__, e.message, scenario)))
-            debug("scenario {}/{} encountered a deferrable exception, continuing".format(i, len(scenarios)))
+            if name_prefix is None:
+                handler(scenario)
+            else:
+                handler(scenario, '{}{}'.format(name_prefix, i))
         except Exception as e:
-            # catch-all for any exceptions not intended to be deferred
-            tracebacks.append(traceback.format_exc(sys.exc_info()))
-            errors.append(type(e)('encountered {} {} running scenario:\n  {}\n'.format(e.__class__.__name__, e.message, scenario)))
-            debug("scenario {}/{} encountered a non-deferrable exception, aborting".format(i, len(scenarios)))
-            raise MultiError(errors, tracebacks)
-
-    if errors:
-        raise MultiError(errors, tracebacks)
+            deferrable = isinstance(e, deferred_exceptions)
+            error = type(e)('encountered {} {} running scenario:\n  {}\n'.format(e.__class__.__name__, e.message, scenario))
+            with lock:
+                failures[i] = (error, traceback.format_exc(sys.exc_info()), deferrable)
+            if deferrable:
+                debug("scenario {}/{} encountered a deferrable exception, continuing".format(i, len(scenarios)))
+            else:
+                # catch-all for any exceptions not intended to be deferred
+                debug("scenario {}/{} encountered a non-deferrable exception, aborting".format(i, len(scenarios)))
+        finally:
+            timings[i - 1] = time.time() - start
+            debug("scenario {}/{} took {:.3f}s".format(i, len(scenarios), timings[i - 1]))
+
+    def aborted():
+        return any(not deferrable for _, _, deferrable in failures.values())
+
+    def worker():
+        while True:
+            with lock:
+                if aborted():
+                    return
+                i = next(numbers, None)
+            if i is None:
+                return
+            run(i)
+
+    if threads > 1:
+        workers = [threading.Thread(target=worker) for _ in xrange(min(threads, len(scenarios)))]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+    else:
+        worker()
+
+    if failures:
+        ordered = [failures[i] for i in sorted(failures)]
+        raise MultiError([e for e, _, _ in ordered], [tb for _, tb, _ in ordered])
+    return timings
@@ -1,6 +1,6 @@
 import time
 
-from dtest import Tester, debug
+from dtest import Tester, debug, wait_for_gossip_normal, wait_for_schema_agreement
 from loadmaker import LoadMaker
 
 class TestGlobalRowKeyCache(Tester):
@@ -42,17 +42,18 @@ class TestGlobalRowKeyCache(Tester):
                         'key_cache_save_period': 5,
                         })
                 cluster.start()
-                time.sleep(.5)
-                cursor = self.cql_connection(node1)
+                wait_for_gossip_normal(cluster)
+                cursor = self.patient_cql_connection(node1)
                 self.create_ks(cursor, ks_name, 3)
-                time.sleep(1) # wait for propagation
+                wait_for_schema_agreement(node1)
 
-                host, port = node1.network_interfaces['thrift']
+                hosts = [node.network_interfaces['binary'][0] for node in cluster.nodelist()]
+                port = node1.network_interfaces['binary'][1]
 
-                # create some load makers
-                lm_standard = LoadMaker(host, port,
+                # create some load makers, sharing one session
+                lm_standard = LoadMaker(hosts, port,
                         keyspace_name=ks_name, column_family_type='standard')
-                lm_counter = LoadMaker(host, port,
+                lm_counter = LoadMaker(hosts, port,
                         keyspace_name=ks_name, column_family_type='standard', is_counter=True)
 
                 # insert some rows
@@ -77,10 +78,14 @@ class TestGlobalRowKeyCache(Tester):
                 time.sleep(1)
                 debug("Starting cluster")
                 cluster.start()
-                time.sleep(5) # read the data back from row and key caches
+                wait_for_gossip_normal(cluster)
+                # the saved row and key caches are loaded in the background
+                # after startup, with nothing to poll for across versions
+                time.sleep(5)
 
-                lm_standard.refresh_connection()
-                lm_counter.refresh_connection()
+                # don't wait for the driver to notice the nodes are back; this
+                # replaces the session lm_counter shares too
+                lm_standard.refresh_connection(force=True)
 
                 debug("Validating again...")
                 for i in range(2):
@@ -88,5 +93,6 @@ class TestGlobalRowKeyCache(Tester):
                     lm_standard.validate()
                     lm_counter.validate()
 
-
+                lm_standard.shutdown()
+                lm_counter.shutdown()
                 cluster.stop()
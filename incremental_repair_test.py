@@ -1,5 +1,5 @@
 from dtest import Tester, debug
-from tools import insert_c1c2, since
+from tools import insert_c1c2, since, quick_stress
 from cassandra import ConsistencyLevel
 from ccmlib.node import Node
 from re import search, findall
@@ -25,7 +25,7 @@ class TestIncRepair(Tester):
 
         node3.stop(gently=True)
 
-        node1.stress(['write', 'n=10000', '-schema', 'replication(factor=3)'])
+        quick_stress(node1, n=10000, rf=3)
         node1.flush()
         node2.flush()
 
@@ -112,7 +112,7 @@ class TestIncRepair(Tester):
         cluster = self.cluster
         cluster.populate(2).start()
         [node1,node2] = cluster.nodelist()
-        node1.stress(['write', 'n=10000', '-schema', 'replication(factor=2)'])
+        quick_stress(node1, n=10000, rf=2)
 
         node1.flush()
         node2.flush()
@@ -130,7 +130,7 @@ class TestIncRepair(Tester):
             initialoutput = g.read()
 
         node1.stop()
-        node2.stress(['write', 'n=15000', '-schema', 'replication(factor=2)'])
+        quick_stress(node2, n=15000, rf=2)
         node2.flush()
         node1.start()
 
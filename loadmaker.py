@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 
-from dtest import debug
+from dtest import debug, LatencyHistogram
+import collections
+import contextlib
 import inspect
+import itertools
 import os
 import pickle
 import platform
@@ -10,14 +13,292 @@ import sys
 import tempfile
 import time
 import uuid
+import yaml
 import pprint
+import random
 import threading
-import cql
 
-try:
-    import cStringIO as StringIO
-except ImportError:
-    import StringIO
+from cassandra import ConsistencyLevel, AlreadyExists, InvalidRequest, Unavailable
+from cassandra.cluster import Cluster as PyCluster, NoHostAvailable
+from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.protocol import SyntaxException
+from cassandra.query import SimpleStatement
+
+
+class TokenBucket(object):
+    """
+    Limits callers of acquire() to rate operations per second, with bursts
+    of up to burst operations. Callers that are over the rate reserve
+    their token and sleep until it is due, so waiting threads are served
+    in order and the rate holds however many threads share the bucket.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, self.rate / 10)
+        self._tokens = self.burst
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+
+    def acquire(self, tokens=1):
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            delay = -self._tokens / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+
+class ValidationSummary(object):
+    """
+    What LoadMaker.validate() checked, and what did not match. Only the
+    first max_examples mismatches are kept, with the expected and read
+    values; expected is None for a deleted row that was read back.
+    """
+
+    def __init__(self, max_examples=10):
+        self.rows_checked = 0
+        self.rows_skipped = 0
+        self.deleted_checked = 0
+        self.mismatch_count = 0
+        self.mismatches = []
+        self.elapsed = 0
+        self._max_examples = max_examples
+
+
+    def add_mismatch(self, row_key, expected, read):
+        self.mismatch_count += 1
+        if len(self.mismatches) < self._max_examples:
+            self.mismatches.append((row_key, expected, read))
+
+
+    def add(self, other):
+        self.rows_checked += other.rows_checked
+        self.rows_skipped += other.rows_skipped
+        self.deleted_checked += other.deleted_checked
+        for mismatch in other.mismatches:
+            if len(self.mismatches) < self._max_examples:
+                self.mismatches.append(mismatch)
+        self.mismatch_count += other.mismatch_count
+
+
+    def __str__(self):
+        out = "%d rows and %d deleted rows checked in %.2fs, %d mismatches" % (
+            self.rows_checked, self.deleted_checked, self.elapsed, self.mismatch_count)
+        if self.rows_skipped:
+            out += ", %d rows skipped" % self.rows_skipped
+        for row_key, expected, read in self.mismatches:
+            out += "\n  %s: should be: %s was: %s" % (row_key, pprint.pformat(expected), pprint.pformat(read))
+        return out
+
+
+
+_MASK64 = (1 << 64) - 1
+
+def _mix64(value):
+    """
+    The splitmix64 finalizer: a bijection on 64 bit integers that spreads
+    consecutive inputs across the whole range.
+    """
+    value = (value ^ (value >> 30)) * 0xbf58476d1ce4e5b9 & _MASK64
+    value = (value ^ (value >> 27)) * 0x94d049bb133111eb & _MASK64
+    return value ^ (value >> 31)
+
+
+
+class KeyValueGenerator(object):
+    """
+    Computes the key of any row index, and the value of any (row, column,
+    generation), from seed alone, so that the expected contents of a row
+    can be looked up in O(1) instead of being kept around.
+
+    Keys are hashed from the row index, so that consecutive rows do not
+    share a common prefix. Values are value_size hex characters.
+
+    next_index(count) picks a row index below count according to
+    distribution: 'uniform', 'sequential' (cycling through the rows in
+    order) or 'zipfian' (a scrambled Zipfian of parameter zipf_theta, as in
+    YCSB, so that the hot rows are spread over the whole key range).
+    """
+
+    DISTRIBUTIONS = ('uniform', 'sequential', 'zipfian')
+
+    def __init__(self, seed=0, value_size=16, distribution='uniform', zipf_theta=0.99):
+        if distribution not in KeyValueGenerator.DISTRIBUTIONS:
+            raise AttributeError("%s is not one of %s" % (distribution, ', '.join(KeyValueGenerator.DISTRIBUTIONS)))
+        self.seed = seed
+        self.value_size = value_size
+        self.distribution = distribution
+        self._seed_offset = _mix64(seed & _MASK64)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_sequential = 0
+
+        # the zeta constant is only ever extended as count grows
+        self._zipf_theta = zipf_theta
+        self._zipf_count = 0
+        self._zipf_zeta = 0.0
+        self._zipf_zeta2 = 1 + 0.5 ** zipf_theta
+
+
+    def _hash(self, *values):
+        hashed = self._seed_offset
+        for value in values:
+            hashed = _mix64((hashed + value + 0x9e3779b97f4a7c15) & _MASK64)
+        return hashed
+
+
+    def row_key(self, index):
+        return u'row_%016x' % self._hash(index)
+
+
+    def value(self, index, column, generation=0):
+        digest = '%016x' % self._hash(index, column, generation)
+        return unicode((digest * (self.value_size // 16 + 1))[:self.value_size])
+
+
+    def next_index(self, count):
+        """ picks a row index in [0, count) """
+        assert count > 0, "There are no rows to choose from!"
+        if self.distribution == 'uniform':
+            return self._random.randrange(count)
+        with self._lock:
+            if self.distribution == 'sequential':
+                index = self._next_sequential % count
+                self._next_sequential = index + 1
+                return index
+            return int(self._hash(self._zipfian_rank(count)) % count)
+
+
+    def _zipfian_rank(self, count):
+        theta = self._zipf_theta
+        if count < self._zipf_count:
+            self._zipf_count, self._zipf_zeta = 0, 0.0
+        for i in xrange(self._zipf_count + 1, count + 1):
+            self._zipf_zeta += 1.0 / i ** theta
+        self._zipf_count = count
+
+        u = self._random.random()
+        uz = u * self._zipf_zeta
+        if uz < 1:
+            return 0
+        if uz < self._zipf_zeta2 or count < 3:
+            return 1
+        eta = (1 - (2.0 / count) ** (1 - theta)) / (1 - self._zipf_zeta2 / self._zipf_zeta)
+        return min(count - 1, int(count * (eta * u - eta + 1) ** (1 / (1 - theta))))
+
+
+
+class ConnectionStats(object):
+    """
+    How much trouble talking to the cluster has been: the number of
+    sessions replaced, of queries retried, and the seconds slept backing
+    off in between.
+    """
+
+    def __init__(self):
+        self.reconnects = 0
+        self.retries = 0
+        self.backoff_time = 0.0
+
+
+    def backoff(self, try_num, base=0.1, cap=10):
+        """
+        sleeps before attempt try_num + 1: exponentially longer with each
+        attempt, up to cap seconds, with half of it jittered so that the
+        threads retrying together spread out.
+        """
+        delay = min(cap, base * 2 ** try_num)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.backoff_time += delay
+        time.sleep(delay)
+
+
+    def __str__(self):
+        return "reconnects=%d retries=%d backoff_time=%.2fs" % (self.reconnects, self.retries, self.backoff_time)
+
+
+
+class SessionPool(object):
+    """
+    Driver sessions shared by all the LoadMakers talking to the same hosts,
+    so that they reuse one set of connections per host. Each session is
+    closed when the last of its users releases it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (hosts, port, protocol_version) -> [cluster, session, users]
+        self._entries = {}
+
+
+    def _connect(self, key, stats, num_retries):
+        hosts, port, protocol_version = key
+        for try_num in xrange(1+num_retries):
+            try:
+                if protocol_version:
+                    cluster = PyCluster(list(hosts), port=port, protocol_version=protocol_version)
+                else:
+                    cluster = PyCluster(list(hosts), port=port)
+                return [cluster, cluster.connect()]
+            except Exception:
+                if try_num == num_retries:
+                    raise
+                stats.backoff(try_num)
+
+
+    def acquire(self, key, stats, num_retries=10):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = self._connect(key, stats, num_retries) + [0]
+            entry[2] += 1
+            return entry[1]
+
+
+    def reconnect(self, key, broken_session, stats, num_retries=10):
+        """
+        replaces broken_session with a new session to the same hosts,
+        unless another user already did.
+        """
+        with self._lock:
+            entry = self._entries[key]
+            if entry[1] is broken_session:
+                entry[0].shutdown()
+                entry[:2] = self._connect(key, stats, num_retries)
+                stats.reconnects += 1
+            return entry[1]
+
+
+    def session(self, key):
+        """ the current session for key, which reconnect() may replace """
+        return self._entries[key][1]
+
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries[key]
+            entry[2] -= 1
+            if entry[2] == 0:
+                del self._entries[key]
+                entry[0].shutdown()
+
+
+session_pool = SessionPool()
+
+
+
+# the expected state of a row that an operation is working on
+_IN_FLIGHT = object()
+
+# errors that retrying the same query cannot fix
+_NOT_RETRIED = (InvalidRequest, AlreadyExists, SyntaxException)
+# errors that guarantee the query was not applied
+_NOT_APPLIED = (Unavailable, NoHostAvailable)
 
 
 class LoadMaker(object):
@@ -28,6 +309,16 @@ class LoadMaker(object):
 
     Defaults are provided in _DEFAULTS, and each can be overwritten
     by passing parameters with the same name to the constructor.
+
+    Talks to the native protocol, either through the given session or through
+    one shared with the other LoadMakers connected to host:port. host may
+    also be a list of hosts to try. Writes, deletes and reads are prepared
+    statements sent concurrency at a time, and the ones that fail are
+    retried.
+
+    generate() may be called from several threads at once. The latency of
+    every operation is recorded in latencies, a LatencyHistogram per
+    operation name.
     """
 
     _DEFAULTS = {
@@ -44,10 +335,22 @@ class LoadMaker(object):
         'key_validation_type': 'text',
         'num_cols': 5,
         'num_counter_rows': 10, # only applies to counter columns
+        'seed': 0,
+        'value_size': 16,
+        'key_distribution': 'uniform',
+    }
+
+    # the key count of each operation, and the operation whose keys it takes
+    _KEY_COUNTS = {
+        'generate': '_inserted_key_count',
+        'update': '_updated_key_count',
+        'delete': '_deleted_key_count',
     }
+    _PREVIOUS_OPERATION = {'update': 'generate', 'delete': 'update'}
 
 
-    def __init__(self, host='localhost', port=9160, create_ks=True, create_cf=True, **kwargs):
+    def __init__(self, host='localhost', port=9042, create_ks=True, create_cf=True,
+                 session=None, protocol_version=None, concurrency=100, **kwargs):
 
         # allow for overwriting any of the defaults
         self._params = LoadMaker._DEFAULTS.copy()
@@ -69,6 +372,14 @@ class LoadMaker(object):
         # column_family_type should be lowercase so that future comparisons will work.
         self._params['column_family_type'] = self._params['column_family_type'].lower()
 
+        # the session may be shared with the test, so never USE a keyspace on it
+        self._table = '%s.%s' % (self._params['keyspace_name'], self._params['column_family_name'])
+        self._consistency_level = ConsistencyLevel.name_to_value[self._params['consistency_level']]
+        self.concurrency = concurrency
+        self.generator = KeyValueGenerator(self._params['seed'], self._params['value_size'],
+                                           self._params['key_distribution'])
+        self._col_names = [self._generate_col_name(i) for i in xrange(self._params['num_cols'] + 1)]
+
         self._num_generate_calls = 0
 
         # Keys are in a sort of ever-growing queue. They are inserted at the
@@ -78,63 +389,92 @@ class LoadMaker(object):
         self._updated_key_count = 0
         self._deleted_key_count = 0
 
+        # the (operation, start, end) key ranges being worked on, and the
+        # (start, end) ranges that an operation failed on
+        self._in_flight = []
+        self._indeterminate = []
+
+        # the expected value of each counter, as a list per row key, and
+        # the row keys that an increment failed on
+        self._counter_totals = {}
+        self._indeterminate_counters = set()
+
         # time each DB operationan and return the last one. Only times,
         # as much as possible, the DB portion of the operation.
         self.last_operation_time = 0
-
-        self._is_keyspace_created = False
-        self.refresh_connection(host, port)
+        self.latencies = {}
+
+        # guards the key counts when generate() is shared by several threads
+        self._lock = threading.Lock()
+
+        self.stats = ConnectionStats()
+        self._given_session = session
+        self._pool_key = None
+        self._protocol_version = protocol_version
+        # the session statements were prepared on, and them by (cql, cl)
+        self._prepared = (None, {})
+        self._hosts = [host] if isinstance(host, basestring) else list(host)
+        self._port = port
+        if session is None:
+            self.refresh_connection()
         if create_ks:
-            self.create_keyspace(self._cursor)
-        self._is_keyspace_created = True
-        cql_str = "USE %s" % self._params['keyspace_name']
-        self.execute_query(cql_str)
+            self.create_keyspace()
 
         if create_cf:
             self.create_column_family()
         elif self._params['is_counter']:
-            # Now find the value that the counters should have. They should all have the same value.
-            row_key = self._generate_row_key(0)
-            col_name = self._generate_col_name(0)
-            cql_str = "SELECT '%s' FROM %s WHERE KEY='%s'"%(
-                    col_name, self._params['column_family_name'], row_key)
-            self.execute_query(cql_str)
-            from_db = self._cursor.fetchone()
-            self._num_generate_calls = from_db[0] or 0
+            # Now find the values that the counters should have.
+            self._counter_totals = self._read_counters()
 
-    
-    @property
-    def _cursor(self):
-        if self._cached_cursor == None:
-            self.refresh_connection()
-        return self._cached_cursor
-                
 
-    def refresh_connection(self, host=None, port=None, cql_version="2.0.0", num_retries=10):
+    def refresh_connection(self, host=None, port=None, num_retries=10, force=False):
         """
         establish a connection to the server. retry if needed.
+
+        The session from session_pool is kept until host or port change, or
+        until force asks for it to be replaced, for all the LoadMakers
+        sharing it: the driver reconnects to restarted nodes by itself. A
+        session given to the constructor is always kept as is.
         """
+        if self._given_session is not None:
+            return
         if host:
-            self._host = host
+            self._hosts = [host] if isinstance(host, basestring) else list(host)
         if port:
             self._port = port
-        self._cql_version = cql_version or None
-            
-        for try_num in xrange(1+num_retries):
-            try:
-                if self._cql_version:
-                    con = cql.connect(self._host, self._port, keyspace=None, cql_version=self._cql_version)
-                else:
-                    con = cql.connect(self._host, self._port, keyspace=None)
-                self._cached_cursor = con.cursor()
-                if self._is_keyspace_created:
-                    cql_str = "USE %s" % self._params['keyspace_name']
-                    self.execute_query(cql_str)
-            except:
-                if try_num < num_retries:
-                    time.sleep(1)
-                else:
-                    raise
+
+        key = (tuple(self._hosts), self._port, self._protocol_version)
+        if key != self._pool_key:
+            session_pool.acquire(key, self.stats, num_retries)
+            if self._pool_key is not None:
+                session_pool.release(self._pool_key)
+            self._pool_key = key
+        elif force:
+            self._reconnect(self._session, num_retries)
+
+
+    def _reconnect(self, broken_session, num_retries=10):
+        """
+        has session_pool replace broken_session, unless another LoadMaker
+        sharing it already did.
+        """
+        if self._pool_key is not None:
+            session_pool.reconnect(self._pool_key, broken_session, self.stats, num_retries)
+
+
+    @property
+    def _session(self):
+        # always read from the pool, as another LoadMaker may have replaced it
+        if self._pool_key is None:
+            return self._given_session
+        return session_pool.session(self._pool_key)
+
+
+    def shutdown(self):
+        """ releases the connection, if it came from the session_pool """
+        if self._pool_key is not None:
+            session_pool.release(self._pool_key)
+            self._pool_key = None
 
 
     def __str__(self):
@@ -150,187 +490,414 @@ class LoadMaker(object):
             '_num_generate_calls': self._num_generate_calls,
         }.items()))
         return "LoadMaker<" + str(params) + ">"
-    
-    
-    def batch_insert(self, rows):
-        cql_stream = StringIO.StringIO()
-        cql_stream.write("BEGIN BATCH USING CONSISTENCY %s\n" % self._params['consistency_level'])
+
+
+    def _record_latency(self, operation, seconds):
+        histogram = self.latencies.get(operation)
+        if histogram is None:
+            histogram = self.latencies.setdefault(operation, LatencyHistogram())
+        histogram.record(seconds)
+
+
+    def _prepare(self, session, cql_str, cl=None):
+        """ prepares cql_str once per session and consistency level """
+        consistency_level = self._consistency_level if cl is None else cl
+        prepared_session, prepared_statements = self._prepared
+        if prepared_session is not session:
+            prepared_statements = {}
+            self._prepared = (session, prepared_statements)
+        prepared = prepared_statements.get((cql_str, consistency_level))
+        if prepared is None:
+            debug(cql_str)
+            prepared = session.prepare(cql_str)
+            prepared.consistency_level = consistency_level
+            prepared_statements[(cql_str, consistency_level)] = prepared
+        return prepared
+
+
+    def execute_concurrent(self, cql_str, parameters, cl=None, idempotent=True, num_retries=10):
+        """
+        executes the prepared cql_str with each of parameters, concurrency at a
+        time, and returns their results in order. The parameters that failed
+        are retried like execute_query does; unless idempotent, only if
+        their failure guarantees that they were not applied.
+        """
+        parameters = list(parameters)
+        results = [None] * len(parameters)
+        pending = range(len(parameters))
+        start = time.time()
+        try_num = 0
+        while pending:
+            session = self._session
+            outcomes = execute_concurrent_with_args(session, self._prepare(session, cql_str, cl),
+                                                    [parameters[i] for i in pending],
+                                                    concurrency=self.concurrency, raise_on_first_error=False)
+            failed = []
+            for i, (success, result) in zip(pending, outcomes):
+                if success:
+                    results[i] = result
+                elif isinstance(result, _NOT_RETRIED) or not (idempotent or isinstance(result, _NOT_APPLIED)):
+                    raise result
+                else:
+                    failed.append((i, result))
+            if failed and try_num == num_retries:
+                raise failed[0][1]
+            if failed:
+                self._retry(try_num, session, [e for i, e in failed])
+            pending = [i for i, e in failed]
+            try_num += 1
+        self.last_operation_time = time.time() - start
+        return results
+
+
+    def batch_insert(self, rows, cl=None):
+        # rows are grouped by column set, since each needs its own statement
+        by_columns = {}
         for key, col_dict in rows.items():
-            col_names = col_dict.keys()
-            columns = ', '.join("'"+str(a)+"'" for a in col_names)
-            values = ', '.join("'"+str(col_dict[a])+"'" for a in col_names)
-            cql_stream.write("INSERT INTO %s (KEY, %s) VALUES ('%s', %s);\n" % (
-                    self._params['column_family_name'],
-                    columns,
-                    key,
-                    values,
-                    ))
-        cql_stream.write("APPLY BATCH;")
-        self.execute_query(cql_stream.getvalue())
+            col_names = tuple(sorted(col_dict.keys()))
+            by_columns.setdefault(col_names, []).append([key] + [col_dict[a] for a in col_names])
 
+        for col_names, parameters in by_columns.items():
+            cql_str = "INSERT INTO %s (key, %s) VALUES (?, %s)" % (
+                self._table, ', '.join(col_names), ', '.join('?' for a in col_names))
+            self.execute_concurrent(cql_str, parameters, cl)
+
+
+    @contextlib.contextmanager
+    def _reserved(self, operation, num_keys, partial=False):
+        """
+        reserves the next num_keys keys for operation, and yields their
+        (start, end) range while the operation works on them. update() and
+        delete() only get the keys that generate() and update() respectively
+        are done with; unless partial, it is an error to ask for more.
 
-    def generate(self, num_keys=10000):
+        Keys that an operation failed on are left indeterminate.
+        """
+        count_attr = LoadMaker._KEY_COUNTS[operation]
+        previous = LoadMaker._PREVIOUS_OPERATION.get(operation)
+        with self._lock:
+            start = getattr(self, count_attr)
+            end = start + num_keys
+            if previous:
+                limit = getattr(self, LoadMaker._KEY_COUNTS[previous])
+                for in_flight_operation, in_flight_start, in_flight_end in self._in_flight:
+                    if in_flight_operation == previous:
+                        limit = min(limit, in_flight_start)
+                if partial:
+                    end = max(start, min(end, limit))
+                assert end <= limit, "You have to %s() more then you %s()!" % (previous, operation)
+            setattr(self, count_attr, end)
+            reservation = (operation, start, end)
+            self._in_flight.append(reservation)
+        try:
+            yield start, end
+        except:
+            with self._lock:
+                self._indeterminate.append((start, end))
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.remove(reservation)
+
+
+    def generate(self, num_keys=10000, cl=None):
         """
         Generates a bunch of data and inserts it into cassandra
         """
         debug("Generate() starting " + str(self))
-        new_inserted_key_count = self._inserted_key_count + num_keys
-        
-        if self._params['is_counter']:
-            self._generate_counter()
-        else:
-            rows = self._gen_rows(self._inserted_key_count, new_inserted_key_count)
-            self.batch_insert(rows)
-            debug("Generate inserted %d rows" % len(rows))
+        start = time.time()
+        # reserve our keys so that concurrent calls write distinct rows
+        with self._reserved('generate', num_keys) as (start_index, end_index):
+            if self._params['is_counter']:
+                self.increment_counters(cl=cl)
+            else:
+                rows = self._gen_rows(start_index, end_index)
+                self.batch_insert(rows, cl)
+                debug("Generate inserted %d rows" % len(rows))
+        self._record_latency('generate', time.time() - start)
 
-        self._inserted_key_count = new_inserted_key_count
-        self._num_generate_calls += 1
+        with self._lock:
+            self._num_generate_calls += 1
 
         return self
 
 
-    def update(self, num_keys=1000):
+    def update(self, num_keys=1000, cl=None, partial=False):
         """
-        Update some keys that were previously inserted.
+        Update some keys that were previously inserted. With partial, update
+        as many of the num_keys next keys as have been inserted.
         """
-        saved_updated_key_count = self._updated_key_count
-        self._updated_key_count += num_keys
-        assert self._updated_key_count <= self._inserted_key_count, "You have to generate() more then you update()!"
-
         if self._params['is_counter']:
-            raise NotImplemented("Counter updates have not been implemented yet.")
-        else:
-            rows = self._gen_rows(saved_updated_key_count, self._updated_key_count)
+            raise NotImplementedError("Counter updates have not been implemented yet.")
+
+        start = time.time()
+        with self._reserved('update', num_keys, partial) as (start_index, end_index):
+            rows = self._gen_rows(start_index, end_index)
             # do the update
-            self.batch_insert(rows)
+            self.batch_insert(rows, cl)
             debug("update() inserted %d rows" % len(rows))
 
             # remove the first column from each row
-            for row_key in rows.keys():
-                col_name = self._generate_col_name(0)
-                cql_str = "DELETE '%s' FROM %s WHERE KEY='%s'"%(col_name, self._params['column_family_name'], row_key)
-                self.execute_query(cql_str)
+            col_name = self._generate_col_name(0)
+            cql_str = "DELETE %s FROM %s WHERE key=?" % (col_name, self._table)
+            self.execute_concurrent(cql_str, ([row_key] for row_key in rows.keys()), cl)
+        self._record_latency('update', time.time() - start)
 
         return self
 
 
-    def delete(self, num_keys=100):
+    def delete(self, num_keys=100, cl=None, partial=False):
         """
-        deletes some rows.
+        deletes some rows. With partial, deletes as many of the num_keys
+        next rows as have been updated.
         """
-        saved_deleted_key_count = self._deleted_key_count
-        self._deleted_key_count += num_keys
-        assert self._deleted_key_count <= self._updated_key_count, "You have to update() more then you delete()!"
-
-        row_keys = [self._generate_row_key(i) for i in xrange(saved_deleted_key_count, self._deleted_key_count)]
-        for row_key in row_keys:
-            cql_str = "DELETE FROM %s WHERE KEY='%s'"%(self._params['column_family_name'], row_key)
-            self.execute_query(cql_str)
+        start = time.time()
+        with self._reserved('delete', num_keys, partial) as (start_index, end_index):
+            cql_str = "DELETE FROM %s WHERE key=?" % self._table
+            self.execute_concurrent(cql_str, ([self._generate_row_key(i)]
+                                              for i in xrange(start_index, end_index)), cl)
+        self._record_latency('delete', time.time() - start)
         return self
-            
 
-    def _iterate_over_counter_columns(self, func):
+
+    def read(self, num_keys=10, cl=None):
         """
-        calls func on every column that should be in the counter column family.
+        reads num_keys rows, picked following the key_distribution, and
+        checks them against what they should contain. Rows that another
+        operation was working on around the read are skipped.
 
-        func should have a signature like this:
-        func(row_key, col_name, subcol_name=None)
+        Returns a ValidationSummary.
         """
-        col_count = 0
+        summary = ValidationSummary()
+        if not self._inserted_key_count:
+            return summary
+
+        start = time.time()
+        indexes = set(self.next_key_index() for i in xrange(num_keys))
+        expected = dict((index, self._expected_state(index)) for index in indexes)
+        read_rows = self.multiget([self._generate_row_key(index) for index in indexes], cl)
+        for index in indexes:
+            if expected[index] is _IN_FLIGHT or self._expected_state(index) != expected[index]:
+                summary.rows_skipped += 1
+                continue
+            row_key = self._generate_row_key(index)
+            if read_rows.get(row_key) != expected[index]:
+                summary.add_mismatch(row_key, expected[index], read_rows.get(row_key))
+            summary.rows_checked += 1
+        self._record_latency('read', time.time() - start)
+        return summary
+
+
+    def _expected_state(self, index):
+        """
+        returns the columns row index should have, None if it should be
+        gone, or _IN_FLIGHT if that is not known.
+        """
+        with self._lock:
+            for operation, start, end in self._in_flight:
+                if start <= index < end:
+                    return _IN_FLIGHT
+            for start, end in self._indeterminate:
+                if start <= index < end:
+                    return _IN_FLIGHT
+            if index < self._deleted_key_count:
+                return None
+        return self.expected_row(index)
+
+
+    def increment_counters(self, delta=1, cl=None):
+        """
+        adds delta to every counter. There are num_counter_rows counter
+        rows, each with self._params['num_cols'] individual counters.
+
+        delta may also be a function of (row_index, col_index), returning
+        what to add to that counter. All the counters of a row are
+        incremented by a single statement, and rows are sent concurrently.
+        """
+        counter_names = self._col_names[:self._params['num_cols']]
+        increments = {}
         for row_index in xrange(self._params['num_counter_rows']):
-            row_key = self._generate_row_key(row_index)
-            for col_index in xrange(self._params['num_cols']):
-                col_name = self._generate_col_name(col_index)
-                func(row_key, col_name)
-                col_count += 1
-        debug("iterated over %d counter columns" % col_count)
+            if callable(delta):
+                deltas = [delta(row_index, col_index) for col_index in xrange(len(counter_names))]
+            else:
+                deltas = [delta] * len(counter_names)
+            increments[self._generate_row_key(row_index)] = deltas
 
+        cql_str = "UPDATE %s SET %s WHERE key=?" % (
+            self._table, ', '.join('%s=%s+?' % (col_name, col_name) for col_name in counter_names))
+        # an increment that timed out may still have been applied
+        try:
+            self.execute_concurrent(cql_str, (deltas + [row_key] for row_key, deltas in increments.items()), cl,
+                                    idempotent=False)
+        except:
+            # which rows got their increment is not known, so validate()
+            # can no longer check any of them
+            with self._lock:
+                self._indeterminate_counters.update(increments)
+            raise
+        finally:
+            with self._lock:
+                for row_key, deltas in increments.items():
+                    totals = self._counter_totals.setdefault(row_key, [0] * len(deltas))
+                    for col_index, col_delta in enumerate(deltas):
+                        totals[col_index] += col_delta
+        return self
 
-    def _generate_counter(self):
+
+    def _read_counters(self, fetch_size=1000):
         """
-        increments all counters. There are num_keys counter rows,
-        each with self._params['num_cols'] individual counters.
-        This increments each by one.
+        reads the whole counter table, a page at a time, and returns the
+        counters of each row as a list.
         """
-        def add_func(row_key, col_name, subcol_name=None):
-            cql_str = """UPDATE %(cf_name)s SET %(col_name)s=%(col_name)s+1
-            WHERE KEY=%(row_key)s;""" % {
-                'cf_name': self._params['column_family_name'],
-                'col_name': col_name,
-                'row_key': row_key,
-            }
-            self.execute_query(cql_str, num_retries=0)
-
-        self._iterate_over_counter_columns(add_func)
+        counter_names = self._col_names[:self._params['num_cols']]
+        col_names = ['key'] + counter_names
+        query = SimpleStatement("SELECT %s FROM %s" % (', '.join(col_names), self._table),
+                                consistency_level=self._consistency_level, fetch_size=fetch_size)
+        counters = {}
+        start = time.time()
+        # a failure on any page restarts the scan
+        for row in self._with_retries(lambda session: list(session.execute(query))):
+            row = self._row_to_dict(row, col_names)
+            counters[row.pop('key')] = [row.get(col_name, 0) for col_name in counter_names]
+        self._record_latency('read_counters', time.time() - start)
+        return counters
+
+
+    def _row_to_dict(self, row, col_names):
+        # the session may have been given a dict_factory
+        if isinstance(row, dict):
+            items = row.items()
+        else:
+            items = zip(col_names, row)
+        return dict((col, value) for col, value in items if value is not None)
 
 
-    def multiget(self, keys):
+    def multiget(self, keys, cl=None):
         assert len(keys) > 0, "At least one key must be specified!"
-        keys_str = ', '.join("'"+str(key)+"'" for key in keys)
-        cql_str = "SELECT * FROM %s USING CONSISTENCY %s WHERE KEY in (%s)" % (
-            self._params['column_family_name'], self._params['consistency_level'], keys_str)
-        self.execute_query(cql_str)
-        rows = self._cursor.result
+        col_names = ['key'] + self._col_names
+        cql_str = "SELECT %s FROM %s WHERE key=?" % (', '.join(col_names), self._table)
+        start = time.time()
+        results = self.execute_concurrent(cql_str, [[key] for key in keys], cl)
+        self._record_latency('multiget', time.time() - start)
         out = {}
-        for row in rows:
-            row_key = row[0].value
-            out[row_key] = {}
-            cols = row[1:]
-            for col in cols:
-                col_name = col.name
-                col_value = col.value
-                out[row_key][col_name] = col_value
+        for rows in results:
+            for row in rows:
+                row = self._row_to_dict(row, col_names)
+                out[row.pop('key')] = row
 
         return out
-        
 
-    def validate(self, start_index=0, end_index=sys.maxint, step=1, server_list=['localhost:9160']):
+
+    def validate(self, start_index=0, end_index=sys.maxint, step=1,
+                 chunk_size=1000, parallel=4, raise_on_mismatch=True):
         """
         gets the rows from start_index (inclusive) to end_index (exclusive) and
         compares them against what they are supposed to be. If end_index
         is greater than what has been inserted, it will read to the last
-        value that was inserted.
+        value that was inserted. Rows that were delete()d are checked to
+        be gone.
+
+        Rows are generated and read chunk_size keys at a time, by parallel
+        threads, so neither side ever holds the whole range in memory.
+
+        Returns a ValidationSummary. Unless raise_on_mismatch is False, an
+        AssertionError is raised if anything did not match.
         """
         debug("validate() starting " + str(self))
         if end_index > self._inserted_key_count:
             end_index = self._inserted_key_count
         assert(start_index <= end_index)
 
+        summary = ValidationSummary()
+        start = time.time()
         if self._params['is_counter']:
-            self._validate_counter()
+            self._validate_counters(summary)
 
         else:
-            # generate what we expect to read
-            rows = self._gen_rows(start_index, end_index, step)
-            read_rows = self.multiget(rows.keys())
-
-            if len(list(read_rows)) < len(rows):
-                raise Exception("number of rows (%s) doesn't match expected number (%s)" % (str(len(read_rows)), str(len(rows))))
+            chunk_span = chunk_size * step
+            chunks = iter(xrange(start_index, end_index, chunk_span))
+            lock = threading.Lock()
+            errors = []
+
+            def validate_chunks():
+                while not errors:
+                    with lock:
+                        chunk_start = next(chunks, None)
+                    if chunk_start is None:
+                        return
+                    try:
+                        chunk_summary = self._validate_chunk(chunk_start, min(end_index, chunk_start + chunk_span), step)
+                    except Exception:
+                        errors.append(sys.exc_info())
+                        return
+                    with lock:
+                        summary.add(chunk_summary)
+
+            threads = [threading.Thread(target=validate_chunks) for i in xrange(parallel)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise errors[0][0], errors[0][1], errors[0][2]
+
+        summary.elapsed = time.time() - start
+        if summary.mismatch_count and raise_on_mismatch:
+            raise AssertionError("validate() failed for %s: %s" % (self, summary))
+
+        debug("validate() done: %s" % summary)
+        return summary
+
+
+    def _validate_chunk(self, start_index, end_index, step):
+        """
+        validates the keys from start_index to end_index, returning a
+        ValidationSummary of them.
+        """
+        summary = ValidationSummary()
 
-            # check every row to make sure everything matches
+        # generate what we expect to read
+        rows = self._gen_rows(start_index, end_index, step)
+        if rows:
+            read_rows = self.multiget(rows.keys())
             for row_key, row_value in rows.items():
-                read_row_value = read_rows[row_key]
+                read_row_value = read_rows.get(row_key)
                 if row_value != read_row_value:
-                    raise AssertionError(
-                    "The value written does not match the value read! should be: %s was: %s" %
-                    (pprint.pformat(row_value), pprint.pformat(read_row_value)))
+                    summary.add_mismatch(row_key, row_value, read_row_value)
+            summary.rows_checked += len(rows)
 
-            # make sure that deleted rows really are gone.
-            row_keys = [self._generate_row_key(i) for i in xrange(0, self._deleted_key_count, step)]
+        # make sure that deleted rows really are gone.
+        deleted_keys = [self._generate_row_key(i) for i in xrange(start_index, min(end_index, self._deleted_key_count), step)]
+        if deleted_keys:
+            for row_key, read_row_value in self.multiget(deleted_keys).items():
+                summary.add_mismatch(row_key, None, read_row_value)
+            summary.deleted_checked += len(deleted_keys)
 
-        debug("validate() succeeded")
-        return self
+        return summary
 
 
-    def _validate_counter(self):
-        def validate_func(row_key, col_name):
-            assert self._num_generate_calls > 0, "Data must be generated before validating!"
-            cql_str = "SELECT '%s' FROM %s WHERE KEY='%s'"%(col_name, self._params['column_family_name'], row_key)
-            self.execute_query(cql_str)
-            from_db = self._cursor.fetchone()
-            val = from_db[0]
-            assert self._num_generate_calls == val, "A counter did not have the right value! %s != %s, QUERY: %s" %(val, self._num_generate_calls, cql_str)
-        self._iterate_over_counter_columns(validate_func)
+    def _validate_counters(self, summary):
+        """
+        compares the whole counter table, read in one paged query, with
+        the totals that were sent. Rows that an increment failed on are
+        skipped.
+        """
+        assert self._counter_totals, "Data must be generated before validating!"
+        read_counters = self._read_counters()
+        with self._lock:
+            counter_totals = dict((row_key, list(totals)) for row_key, totals in self._counter_totals.items()
+                                  if row_key not in self._indeterminate_counters)
+            for row_key in self._indeterminate_counters:
+                read_counters.pop(row_key, None)
+        for row_key, totals in counter_totals.items():
+            read_totals = read_counters.pop(row_key, None)
+            # a counter that was never written reads as null, not 0
+            if read_totals != totals and (read_totals or any(totals)):
+                summary.add_mismatch(row_key, totals, read_totals)
+        # anything left over was never written by us
+        for row_key, read_totals in read_counters.items():
+            summary.add_mismatch(row_key, None, read_totals)
+        summary.rows_checked += len(counter_totals)
 
 
     def _gen_rows(self, start_index, end_index, step=1):
@@ -340,113 +907,221 @@ class LoadMaker(object):
         """
         rows = dict()
         for row_num in xrange(max(start_index, self._deleted_key_count), end_index, step):
-            if row_num < self._updated_key_count:
-                is_update = True
-                shift_by_one = 1
-            else:
-                is_update = False
-                shift_by_one = 0
-            cols = dict((
-                    self._generate_col_name(i),
-                    self._generate_col_value(i, is_update))
-                    for i in xrange(shift_by_one, self._params['num_cols']+shift_by_one))
-
-            rows[self._generate_row_key(row_num)] = cols
+            rows[self._generate_row_key(row_num)] = self.expected_row(row_num)
 
         return rows
 
 
+    def expected_row(self, index):
+        """
+        returns the columns that row index should have. update()d rows are
+        shifted right by one column, and have their values regenerated.
+        """
+        generation = 1 if index < self._updated_key_count else 0
+        value = self.generator.value
+        return dict((self._col_names[i], value(index, i, generation))
+                    for i in xrange(generation, self._params['num_cols'] + generation))
+
+
+    def next_key_index(self):
+        """ picks one of the inserted rows, following the key_distribution """
+        return self.generator.next_index(self._inserted_key_count)
+
+
     def _generate_row_key(self, num):
-        return self._convert(prefix='row_', num=num)
+        return self.generator.row_key(num)
 
 
     def _generate_col_name(self, num):
         return self._convert(prefix='col_', num=num)
 
 
-    def _generate_col_value(self, num, is_update=False):
-        # is_update means that the value should be modified to indicate it has been updated.
-        prefix = 'val_'
-        if is_update:
-            num += 10000
-            prefix = 'val_updated_'
-        return self._convert(prefix=prefix, num=num)
-
-
     def _convert(self, prefix=None, num=None):
-        return str(prefix + str(num))
+        return unicode(prefix + str(num))
 
 
-    def create_keyspace(self, cursor):
+    def create_keyspace(self):
         keyspace_name = self._params['keyspace_name']
-        cql_str = ("CREATE KEYSPACE %s WITH strategy_class=SimpleStrategy AND "
-                "strategy_options:replication_factor=%d" % (keyspace_name, int(self._params['replication_factor'])))
+        cql_str = ("CREATE KEYSPACE %s WITH replication = {'class': 'SimpleStrategy', "
+                "'replication_factor': %d}" % (keyspace_name, int(self._params['replication_factor'])))
         try:
             self.execute_query(cql_str)
-        except cql.ProgrammingError, e:
-            # the ks already exists
+        except AlreadyExists:
             pass
 
 
     def create_column_family(self):
         """ The columnfamily should not already exist! """
-        cf_name = self._params['column_family_name']
         if self._params['is_counter']:
+            # one counter per column
+            columns = ', '.join('%s counter' % self._generate_col_name(i)
+                                for i in xrange(self._params['num_cols']))
             cql_str = """
-            CREATE COLUMNFAMILY %s (KEY text PRIMARY KEY) WITH default_validation=counter""" % cf_name
+            CREATE TABLE %s (key text PRIMARY KEY, %s)""" % (self._table, columns)
             self.execute_query(cql_str)
         else:
+            # update() moves rows one column to the right, hence num_cols + 1 columns
+            columns = ', '.join('%s %s' % (self._generate_col_name(i), self._params['validation_type'])
+                                for i in xrange(self._params['num_cols'] + 1))
             cql_str = """
-            CREATE COLUMNFAMILY %s (KEY %s PRIMARY KEY) WITH comparator=%s
-            AND default_validation=%s""" % (cf_name, 
+            CREATE TABLE %s (key %s PRIMARY KEY, %s)""" % (self._table,
                 self._params['key_validation_type'],
-                self._params['comparator_type'],
-                self._params['validation_type'])
+                columns)
             self.execute_query(cql_str)
 
-    
+
     def execute_query(self, cql_str, num_retries=10):
         """
-        execute the query, and retry several times if needed.
+        execute the query, and retry several times if needed, backing off
+        in between. The driver sends each attempt to the next live node.
+        Only when no node at all could be reached is the session replaced.
+        Returns the result.
         """
         debug(cql_str)
+        query = SimpleStatement(cql_str, consistency_level=self._consistency_level)
+        return self._with_retries(lambda session: session.execute(query), num_retries)
+
+
+    def _with_retries(self, operation, num_retries=10):
+        """ calls operation(session) until it succeeds, retrying as execute_query does """
         for try_num in xrange(num_retries+1):
+            session = self._session
             try:
-                self._cursor.execute(cql_str)
-            except cql.ProgrammingError:
+                return operation(session)
+            except _NOT_RETRIED:
                 raise
             except Exception, e:
                 if try_num == num_retries:
                     raise
-                # try to reconnect
-                time.sleep(1)
-                self.refresh_connection()
-            else:
-                break
+                self._retry(try_num, session, [e])
 
 
+    def _retry(self, try_num, session, errors):
+        """
+        backs off before retrying what failed on session with errors. The
+        session is replaced if it could not reach any node at all.
+        """
+        self.stats.retries += 1
+        self.stats.backoff(try_num)
+        if any(isinstance(e, NoHostAvailable) for e in errors):
+            self._reconnect(session)
+
+
+
+class Workload(object):
+    """
+    A mix of LoadMaker operations for ContinuousLoader to run, usually
+    read from a YAML profile with Workload.load():
+
+        threads: 8
+        ops_per_second: 500     # all threads together, unlimited if absent
+        duration: 60            # seconds, runs until exit() if absent
+        batch_size: 10          # keys per operation
+        key_distribution: zipfian
+        operations:
+          insert: 4             # a ratio alone,
+          read: {ratio: 4, cl: QUORUM}
+          update: {ratio: 1, cl: ONE, batch_size: 100}
+          delete: 1
+
+    Inserts generate() new rows, updates and deletes work through the rows
+    in the order generate() wrote them, and reads check batch_size rows
+    picked following key_distribution. Counter LoadMakers only take inserts.
+    """
 
-class ContinuousLoader(threading.Thread):
+    OPERATIONS = ('insert', 'read', 'update', 'delete')
+
+    def __init__(self, operations={'insert': 1}, threads=4, ops_per_second=None, duration=None,
+                 batch_size=3, key_distribution=None):
+        self.threads = threads
+        self.ops_per_second = ops_per_second
+        self.duration = duration
+        self.key_distribution = key_distribution
+        if key_distribution is not None and key_distribution not in KeyValueGenerator.DISTRIBUTIONS:
+            raise AttributeError("%s is not one of %s" % (key_distribution, ', '.join(KeyValueGenerator.DISTRIBUTIONS)))
+
+        # (cumulative ratio, operation, cl, batch_size)
+        self._choices = []
+        total = 0
+        for operation, spec in sorted(operations.items()):
+            if operation not in Workload.OPERATIONS:
+                raise AttributeError("%s is not one of %s" % (operation, ', '.join(Workload.OPERATIONS)))
+            if not isinstance(spec, dict):
+                spec = {'ratio': spec}
+            cl = spec.get('cl')
+            if cl is not None:
+                cl = ConsistencyLevel.name_to_value[cl.upper()]
+            total += spec.get('ratio', 1)
+            self._choices.append((total, operation, cl, spec.get('batch_size', batch_size)))
+        assert total > 0, "A workload needs at least one operation!"
+        self._random = random.Random()
+
+
+    @staticmethod
+    def load(path):
+        """ reads a workload profile from a YAML file """
+        with open(path) as f:
+            profile = yaml.safe_load(f)
+        return Workload(**profile)
+
+
+    def choose(self):
+        """ returns the (operation, cl, batch_size) of the next op """
+        point = self._random.uniform(0, self._choices[-1][0])
+        for total, operation, cl, batch_size in self._choices:
+            if point < total:
+                return operation, cl, batch_size
+        return self._choices[-1][1:]
+
+
+
+class ContinuousLoader(object):
     """
     Hits the db continuously with LoadMaker. Can handle standard and 
     counter columnfamilies
 
-    Applies each type of load in a round-robin fashion
+    Runs threads workers that share the load_makers in a round-robin
+    fashion, each op being one generate() of keys_per_op keys, or one
+    operation of workload. When ops_per_second is given, a TokenBucket
+    holds the workers to that rate. The latency of every op is recorded in
+    the LoadMaker's latencies.
     """
-    def __init__(self, load_makers=[], sleep_between=1):
+    def __init__(self, load_makers=[], sleep_between=0, threads=4, ops_per_second=None, keys_per_op=3,
+                 workload=None):
         """
         load_makers is a list of load_makers to run
 
         sleep_between will slow down loading of the cluster
-        by sleeping between every insert operation this many seconds.
+        by having each worker sleep between every insert operation this
+        many seconds.
+
+        workload, a Workload, overrides threads and ops_per_second, and
+        stops the loader once its duration has passed.
         """
         self._load_makers = load_makers
         self._sleep_between = sleep_between
-        self._inserting_lock = threading.Lock()
+        self._keys_per_op = keys_per_op
+        self._workload = workload
+        self._deadline = None
+        if workload is not None:
+            threads, ops_per_second = workload.threads, workload.ops_per_second
+            if workload.duration:
+                self._deadline = time.time() + workload.duration
+            if workload.key_distribution:
+                for load_maker in load_makers:
+                    load_maker.generator.distribution = workload.key_distribution
+        self._limiter = TokenBucket(ops_per_second) if ops_per_second else None
+        self._next_load_maker = itertools.cycle(load_makers)
+
+        # what the ops did, and what the reads found
+        self.op_counts = collections.Counter()
+        self.read_summary = ValidationSummary()
+
+        # pause() waits on _condition until no worker is inside an op
+        self._condition = threading.Condition()
+        self._active = 0
         self._is_loading = True
         self._should_exit = False
-        super(ContinuousLoader, self).__init__()
-        self.setDaemon(True)
         self.exception = None
 
         # make sure each loader gets called at least once.
@@ -454,51 +1129,113 @@ class ContinuousLoader(threading.Thread):
         self._generate_load_once()
 
         # now fire up the loaders to continuously load the system.
-        self.start()
+        self._workers = []
+        for i in xrange(threads):
+            worker = threading.Thread(target=self._run, name="ContinuousLoader-%d" % i)
+            worker.setDaemon(True)
+            worker.start()
+            self._workers.append(worker)
 
 
-    def run(self):
+    def _run(self):
         """
         applies load whenever it isn't paused.
         """
-        debug("Loadmaker started")
-        while True:
-            if self._should_exit:
-                break
-            self._generate_load_once()
+        debug("Loadmaker worker started")
+        while self._enter():
+            try:
+                with self._condition:
+                    load_maker = next(self._next_load_maker)
+                self._run_op(load_maker)
+            except Exception:
+                with self._condition:
+                    self._should_exit = True
+                return
+            finally:
+                self._leave()
+            if self._sleep_between:
+                time.sleep(self._sleep_between)
         debug("continuous loader exiting.")
 
 
+    def _enter(self):
+        """
+        blocks while paused, then registers the calling worker as active.
+        Returns False when the worker should exit instead.
+        """
+        with self._condition:
+            while not self._is_loading and not self._should_exit:
+                self._condition.wait()
+            if self._deadline and time.time() >= self._deadline:
+                self._should_exit = True
+            if self._should_exit:
+                return False
+            self._active += 1
+            return True
+
+
+    def _leave(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+
+    def _run_op(self, load_maker, operation=None):
+        if self._limiter:
+            self._limiter.acquire()
+        cl, num_keys = None, self._keys_per_op
+        if operation is None and self._workload is not None:
+            operation, cl, num_keys = self._workload.choose()
+        if operation is None or load_maker._params['is_counter']:
+            operation = 'insert'
+        try:
+            if operation == 'insert':
+                load_maker.generate(num_keys=num_keys, cl=cl)
+            elif operation == 'update':
+                load_maker.update(num_keys, cl=cl, partial=True)
+            elif operation == 'delete':
+                load_maker.delete(num_keys, cl=cl, partial=True)
+            else:
+                summary = load_maker.read(num_keys, cl=cl)
+                with self._condition:
+                    self.read_summary.add(summary)
+                if summary.mismatch_count:
+                    raise AssertionError("read() did not get what was written: %s" % summary)
+            with self._condition:
+                self.op_counts[operation] += 1
+        except Exception, e:
+            # if anything goes wrong, store the exception
+            e.args = e.args + (str(load_maker), )
+            if self.exception is None:
+                self.exception = (e, sys.exc_info()[2])
+            raise
+
+
     def _generate_load_once(self):
         """
         runs one round of load with all the load_makers.
         """
         debug("ContinuousLoader()._generate_load_once() starting")
         for load_maker in self._load_makers:
-            self._inserting_lock.acquire()
+            self._run_op(load_maker, 'insert')
+        debug("ContinuousLoader()._generate_load_once() done.")
 
-            # exit if needed.
-            if self._should_exit:
-                return
 
-            try:
-                load_maker.generate(num_keys=3)
-            except Exception, e:
-                # if anything goes wrong, store the exception
-                e.args = e.args + (str(load_maker), )
-                self.exception = (e, sys.exc_info()[2])
-                raise
-            finally:
-                self._inserting_lock.release()
-            if self._sleep_between:
-                time.sleep(self._sleep_between)
-        debug("ContinuousLoader()._generate_load_once() done.")
+    def wait(self):
+        """
+        waits for the workers to be done, which only happens by
+        themselves when the workload has a duration.
+        """
+        for worker in self._workers:
+            worker.join()
 
 
     def exit(self):
-        self._should_exit = True
-        if self._is_loading == False:
-            self.unpause()
+        with self._condition:
+            self._should_exit = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
 
 
     def check_exc(self):
@@ -510,6 +1247,18 @@ class ContinuousLoader(threading.Thread):
             raise self.exception[0], None, self.exception[1]
 
 
+    def latencies(self):
+        """
+        returns the generate() latencies of all the load_makers, merged
+        into one LatencyHistogram.
+        """
+        merged = LatencyHistogram()
+        for load_maker in self._load_makers:
+            if 'generate' in load_maker.latencies:
+                merged.merge(load_maker.latencies['generate'])
+        return merged
+
+
     def read_and_validate(self, step=100, pause_before_validate=3):
         """
         reads back all the data that has been inserted.
@@ -528,26 +1277,44 @@ class ContinuousLoader(threading.Thread):
                 e.args = e.args + (str(load_maker), )
                 raise
         self.unpause()
+        for load_maker in self._load_makers:
+            debug("%s generate latencies: %s" % (load_maker, load_maker.latencies.get('generate')))
 
 
     def pause(self):
         """
-        acquires the _inserting_lock to stop the loading from happening.
+        stops the loading, and waits for the ops in flight to finish.
         """
-        assert self._is_loading == True, "Called Pause while not loading!"
-        self._inserting_lock.acquire()
+        with self._condition:
+            assert self._is_loading == True, "Called Pause while not loading!"
+            self._is_loading = False
+            while self._active:
+                self._condition.wait()
         debug("paused continuousloader...")
-        self._is_loading = False
 
 
     def unpause(self):
         """
-        releases the _inserting_lock to resume loading.
+        resumes the loading.
         """
-        assert self._is_loading == False, "Called Pause while loading!"
-        debug("unpausing continuousloader...")
-        self._inserting_lock.release()
-        self._is_loading = True
-
+        with self._condition:
+            assert self._is_loading == False, "Called Pause while loading!"
+            debug("unpausing continuousloader...")
+            self._is_loading = True
+            self._condition.notify_all()
 
 
+def run_workload(load_makers, workload):
+    """
+    runs workload, a Workload or the path of a profile, on load_makers until
+    its duration has passed. Raises the first error an op ran into, and
+    returns the ContinuousLoader, for its op_counts and read_summary.
+    """
+    if isinstance(workload, basestring):
+        workload = Workload.load(workload)
+    assert workload.duration, "run_workload() needs a workload with a duration!"
+    loader = ContinuousLoader(load_makers, workload=workload)
+    loader.wait()
+    loader.check_exc()
+    debug("workload done: %s, reads: %s" % (dict(loader.op_counts), loader.read_summary))
+    return loader
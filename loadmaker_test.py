@@ -0,0 +1,89 @@
+import os, time
+
+from dtest import Tester, debug
+from cassandra import ConsistencyLevel
+from loadmaker import LoadMaker, ContinuousLoader, Workload, run_workload
+
+MIXED_WORKLOAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workloads', 'mixed.yaml')
+
+class TestLoadMaker(Tester):
+
+    def _load_makers(self):
+        """
+        starts a 3 node cluster, and returns a standard and a counter
+        LoadMaker on it.
+        """
+        cluster = self.cluster
+        cluster.populate(3).start()
+        node1 = cluster.nodelist()[0]
+        # wait for the native transport
+        self.patient_cql_connection(node1)
+
+        hosts = [node.network_interfaces['binary'][0] for node in cluster.nodelist()]
+        port = node1.network_interfaces['binary'][1]
+        return [LoadMaker(hosts, port, column_family_type='standard'),
+                LoadMaker(hosts, port, column_family_type='standard', is_counter=True)]
+
+    def mixed_workload_test(self):
+        """
+        Run workloads/mixed.yaml for a few seconds, and check that every
+        operation ran and that the data validates afterwards.
+        """
+        workload = Workload.load(MIXED_WORKLOAD)
+        self.assertEqual(set([ConsistencyLevel.QUORUM]), set(workload.choose()[1] for i in xrange(100)))
+        chosen = [workload.choose()[0] for i in xrange(10000)]
+        # insert: 4, read: 4, update: 1, delete: 1
+        self.assertAlmostEqual(0.4, chosen.count('insert') / 10000.0, delta=0.05)
+        self.assertAlmostEqual(0.1, chosen.count('delete') / 10000.0, delta=0.05)
+
+        load_makers = self._load_makers()
+        workload.duration = 5
+        start = time.time()
+        loader = run_workload(load_makers, workload)
+        self.assertGreaterEqual(time.time() - start, workload.duration)
+        for operation in Workload.OPERATIONS:
+            self.assertGreater(loader.op_counts[operation], 0, "no %s ran" % operation)
+        self.assertEqual(0, loader.read_summary.mismatch_count)
+
+        debug("Validating")
+        for load_maker in load_makers:
+            load_maker.validate()
+            load_maker.shutdown()
+
+    def continuous_loader_test(self):
+        """
+        Start a rate limited ContinuousLoader, check that no ops run while
+        it is paused and that they pick up again when it is resumed, then
+        check that the workers stop on the first error.
+        """
+        load_makers = self._load_makers()
+        ops_per_second = 20
+        loader = ContinuousLoader(load_makers, threads=4, ops_per_second=ops_per_second)
+        time.sleep(2)
+        loader.pause()
+        running = 2
+        paused_count = sum(loader.op_counts.values())
+        self.assertGreater(paused_count, len(load_makers))
+        time.sleep(2)
+        self.assertEqual(paused_count, sum(loader.op_counts.values()))
+
+        loader.unpause()
+        time.sleep(2)
+        running += 2
+        loader.pause()
+        count = sum(loader.op_counts.values())
+        self.assertGreater(count, paused_count)
+        # allow a second for the first ops, the bursts, and the ops that
+        # had already taken their token when pause() was called
+        self.assertLessEqual(count, ops_per_second * (running + 1))
+        loader.check_exc()
+
+        # the tables are gone, so the workers fail and exit by themselves
+        cursor = self.patient_cql_connection(self.cluster.nodelist()[0])
+        cursor.execute("DROP KEYSPACE Keyspace_lm")
+        loader.unpause()
+        loader.wait()
+        self.assertRaises(Exception, loader.check_exc)
+        loader.exit()
+        for load_maker in load_makers:
+            load_maker.shutdown()
@@ -1,13 +1,10 @@
 from dtest import Tester
-from tools import new_node
+from tools import new_node, quick_stress
 
 class TestNodetool(Tester):
 
     def stress(self, cluster, node):
-        if cluster.version() < "2.1":
-            node.stress(['-n', '25000'])
-        else:
-            node.stress(['write', 'n=25000'])
+        quick_stress(node, n=25000)
 
     def cleanup_test(self):
         cluster = self.cluster
@@ -20,6 +17,6 @@ class TestNodetool(Tester):
         node1.flush()
         node2 = new_node(cluster)
         node2.start()
-        node2.watch_log_for("Bootstrap completed")
+        self.log_watcher.wait_for(node2, "Bootstrap completed")
 
         node1.cleanup()
\ No newline at end of file
@@ -1,13 +1,17 @@
+import threading
 import time
 import uuid
+from collections import deque
 
 from cassandra import ConsistencyLevel as CL
 from cassandra import InvalidRequest
+from cassandra.policies import TokenAwarePolicy, RoundRobinPolicy
 from cassandra.query import SimpleStatement, dict_factory
 from dtest import Tester, run_scenarios
 from tools import since
 
-from datahelp import create_rows, parse_data_into_dicts, flatten_into_set
+from assertions import assert_rows_equal_ignore_order, assert_rows_subset
+from datahelp import create_rows, load_rows, parse_data_into_dicts
 
 class Page(object):
     data = None
@@ -26,6 +30,11 @@ class PageFetcher(object):
 
     The first page is automatically retrieved, so an initial
     call to request_one is actually getting the *second* page!
+
+    With prefetch > 0, the next page is requested as soon as one arrives,
+    as long as fewer than prefetch pages are waiting to be consumed, and
+    pages are consumed with stream_pages/stream_rows instead of being kept.
+    The constructor still only waits for the first page.
     """
     pages = None
     error = None
@@ -34,8 +43,12 @@ class PageFetcher(object):
     retrieved_pages = None
     retrieved_empty_pages = None
 
-    def __init__(self, future):
+    def __init__(self, future, prefetch=0):
         self.pages = []
+        self.prefetch = prefetch
+        self._queue = deque()
+        # signalled whenever a page or an error is received
+        self._cond = threading.Condition()
 
         # the first page is automagically returned (eventually)
         # so we'll count this as a request, but the retrieved count
@@ -52,27 +65,49 @@ class PageFetcher(object):
 
         # wait for the first page to arrive, otherwise we may call
         # future.has_more_pages too early, since it should only be
-        # called after the first page is returned
-        self.wait(seconds=30)
+        # called after the first page is returned. With prefetch, more
+        # pages may be in flight by then, so don't wait for those
+        self._wait_until(lambda: self.retrieved_pages + self.retrieved_empty_pages > 0, seconds=30)
 
     def handle_page(self, rows):
-        # occasionally get a final blank page that is useless
-        if rows == []:
-            self.retrieved_empty_pages += 1
-            return
-
-        page = Page()
-        self.pages.append(page)
+        with self._cond:
+            # occasionally get a final blank page that is useless
+            if rows == []:
+                self.retrieved_empty_pages += 1
+            else:
+                page = Page()
+                for row in rows:
+                    page.add_row(row)
 
-        for row in rows:
-            page.add_row(row)
+                if self.prefetch:
+                    self._queue.append(page)
+                else:
+                    self.pages.append(page)
+                self.retrieved_pages += 1
 
-        self.retrieved_pages += 1
+            self._prefetch_next()
+            self._cond.notify_all()
 
     def handle_error(self, exc):
-        self.error = exc
+        with self._cond:
+            self.error = exc
+            self._cond.notify_all()
         raise exc
 
+    def _in_flight(self):
+        return self.requested_pages != (self.retrieved_pages + self.retrieved_empty_pages)
+
+    def _fetch_next(self):
+        with self._cond:
+            self.requested_pages += 1
+            self.future.start_fetching_next_page()
+
+    def _prefetch_next(self):
+        # only called with self._cond held
+        if self.prefetch and self.error is None and not self._in_flight() \
+                and len(self._queue) < self.prefetch and self.future.has_more_pages:
+            self._fetch_next()
+
     def request_one(self):
         """
         Requests the next page if there is one.
@@ -80,8 +115,7 @@ class PageFetcher(object):
         If the future is exhausted, this is a no-op.
         """
         if self.future.has_more_pages:
-            self.future.start_fetching_next_page()
-            self.requested_pages += 1
+            self._fetch_next()
             self.wait()
 
         return self
@@ -93,8 +127,7 @@ class PageFetcher(object):
         If the future is exhausted, this is a no-op.
         """
         while self.future.has_more_pages:
-            self.future.start_fetching_next_page()
-            self.requested_pages += 1
+            self._fetch_next()
             self.wait()
 
         return self
@@ -105,15 +138,57 @@ class PageFetcher(object):
 
         Requests are made by calling request_one and/or request_all.
 
-        Raises RuntimeError if seconds is exceeded.
+        Raises RuntimeError if seconds is exceeded, or as soon as a page request fails.
         """
+        return self._wait_until(lambda: not self._in_flight(), seconds)
+
+    def _wait_until(self, done, seconds):
         expiry = time.time() + seconds
 
-        while time.time() < expiry:
-            if self.requested_pages == (self.retrieved_pages + self.retrieved_empty_pages):
-                return self
+        with self._cond:
+            while not done():
+                remaining = expiry - time.time()
+                if self.error is not None:
+                    raise RuntimeError("Requested pages were not delivered before timeout (request failed: %s)" % self.error)
+                if remaining <= 0:
+                    raise RuntimeError("Requested pages were not delivered before timeout.")
+                self._cond.wait(remaining)
 
-        raise RuntimeError("Requested pages were not delivered before timeout.")
+        return self
+
+    def stream_pages(self, seconds=5):
+        """
+        Yields the pages of the result set as they arrive. Requires prefetch > 0.
+
+        Pages handed out here are not kept, so pagecount, page_data and all_data
+        don't see them.
+
+        Raises RuntimeError if no page arrives within seconds.
+        """
+        assert self.prefetch, "stream_pages requires a PageFetcher created with prefetch > 0"
+        while True:
+            expiry = time.time() + seconds
+            with self._cond:
+                self._prefetch_next()
+                while not self._queue:
+                    if not self._in_flight() and not self.future.has_more_pages:
+                        return
+                    remaining = expiry - time.time()
+                    if self.error is not None:
+                        raise RuntimeError("Requested pages were not delivered before timeout (request failed: %s)" % self.error)
+                    if remaining <= 0:
+                        raise RuntimeError("Requested pages were not delivered before timeout.")
+                    self._cond.wait(remaining)
+                page = self._queue.popleft()
+            yield page
+
+    def stream_rows(self, seconds=5):
+        """
+        Yields the rows of the result set page by page, see stream_pages.
+        """
+        for page in self.stream_pages(seconds=seconds):
+            for row in page.data:
+                yield row
 
     def pagecount(self):
         """
@@ -163,18 +238,18 @@ class PageFetcher(object):
 class PageAssertionMixin(object):
     """Can be added to subclasses of unittest.Tester"""
     def assertEqualIgnoreOrder(self, actual, expected):
-        return self.assertItemsEqual(actual, expected)
+        assert_rows_equal_ignore_order(actual, expected)
 
     def assertIsSubsetOf(self, subset, superset):
-        assert flatten_into_set(subset).issubset(flatten_into_set(superset))
+        assert_rows_subset(subset, superset)
 
 
 class BasePagingTester(Tester):
     def prepare(self):
-        cluster = self.cluster
-        cluster.populate(3).start()
+        cluster = self.populate_cluster(3)
         node1, node2, node3 = cluster.nodelist()
-        cursor = self.cql_connection(node1)
+        # token aware, so that load_rows sends its batches straight to a replica
+        cursor = self.cql_connection(node1, load_balancing_policy=TokenAwarePolicy(RoundRobinPolicy()))
         cursor.row_factory = dict_factory
         return cursor
 
@@ -505,7 +580,9 @@ class TestPagingWithModifiers(BasePagingTester, PageAssertionMixin):
             # make sure all the data retrieved is a subset of input data
             self.assertIsSubsetOf(pf.all_data(), expected_data)
 
-        run_scenarios(scenarios, handle_scenario, deferred_exceptions=(AssertionError,))
+        # scenarios only read the rows loaded above, so they can share the
+        # table and run side by side; ones that wrote would need a name_prefix
+        run_scenarios(scenarios, handle_scenario, deferred_exceptions=(AssertionError,), threads=4)
 
     def test_with_allow_filtering(self):
         cursor = self.prepare()
@@ -598,12 +675,20 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
             SimpleStatement("select * from paging_test where id in (1,2)", fetch_size=3000, consistency_level=CL.ALL)
         )
 
-        pf = PageFetcher(future).request_all()
+        # keep a page fetched ahead, and compare the rows as they stream in
+        pf = PageFetcher(future, prefetch=1)
+        page_sizes = []
 
-        self.assertEqual(pf.pagecount(), 4)
-        self.assertEqual(pf.num_results_all(), [3000, 3000, 3000, 1000])
+        def streamed_rows():
+            for page in pf.stream_pages():
+                page_sizes.append(len(page.data))
+                for row in page.data:
+                    yield row
 
-        self.assertEqualIgnoreOrder(pf.all_data(), expected_data)
+        self.assertEqualIgnoreOrder(streamed_rows(), expected_data)
+        self.assertEqual(page_sizes, [3000, 3000, 3000, 1000])
+        # streamed pages are not kept
+        self.assertEqual(pf.pagecount(), 0)
 
     def test_paging_using_secondary_indexes(self):
         cursor = self.prepare()
@@ -729,7 +814,7 @@ class TestPagingDatasetChanges(BasePagingTester, PageAssertionMixin):
           *500| 2  | [random] |
             """
 
-        create_rows(data, cursor, 'paging_test', cl=CL.ALL, format_funcs={'id': int, 'mytext': random_txt})
+        load_rows(data, cursor, 'paging_test', cl=CL.ALL, format_funcs={'id': int, 'mytext': random_txt})
 
         future = cursor.execute_async(
             SimpleStatement("select * from paging_test where id in (1,2)", fetch_size=500, consistency_level=CL.ALL)
@@ -852,17 +937,16 @@ class TestPagingDatasetChanges(BasePagingTester, PageAssertionMixin):
         self.assertEqualIgnoreOrder(page3, page3expected)
 
     def test_node_unavailabe_during_paging(self):
-        cluster = self.cluster
-        cluster.populate(3).start()
+        cluster = self.populate_cluster(3)
         node1, node2, node3 = cluster.nodelist()
-        cursor = self.cql_connection(node1)
+        cursor = self.cql_connection(node1, load_balancing_policy=TokenAwarePolicy(RoundRobinPolicy()))
         self.create_ks(cursor, 'test_paging_size', 1)
         cursor.execute("CREATE TABLE paging_test ( id uuid, mytext text, PRIMARY KEY (id, mytext) )")
 
         def make_uuid(text):
             return uuid.uuid4()
 
-        create_rows(
+        load_rows(
             """
                   | id      | mytext |
             *10000| [uuid]  | foo    |
@@ -958,14 +1042,14 @@ class TestPagingQueryIsolation(BasePagingTester, PageAssertionMixin):
         self.assertEqual(page_fetchers[9].pagecount(), 4)
         self.assertEqual(page_fetchers[10].pagecount(), 34)
 
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[0].all_data()), flatten_into_set(expected_data[:5000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[1].all_data()), flatten_into_set(expected_data[5000:10000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[2].all_data()), flatten_into_set(expected_data[10000:15000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[3].all_data()), flatten_into_set(expected_data[15000:20000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[4].all_data()), flatten_into_set(expected_data[20000:25000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[5].all_data()), flatten_into_set(expected_data[:5000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[6].all_data()), flatten_into_set(expected_data[5000:10000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[7].all_data()), flatten_into_set(expected_data[10000:15000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[8].all_data()), flatten_into_set(expected_data[15000:20000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[9].all_data()), flatten_into_set(expected_data[20000:25000]))
-        self.assertEqualIgnoreOrder(flatten_into_set(page_fetchers[10].all_data()), flatten_into_set(expected_data[:50000]))
+        self.assertEqualIgnoreOrder(page_fetchers[0].all_data(), expected_data[:5000])
+        self.assertEqualIgnoreOrder(page_fetchers[1].all_data(), expected_data[5000:10000])
+        self.assertEqualIgnoreOrder(page_fetchers[2].all_data(), expected_data[10000:15000])
+        self.assertEqualIgnoreOrder(page_fetchers[3].all_data(), expected_data[15000:20000])
+        self.assertEqualIgnoreOrder(page_fetchers[4].all_data(), expected_data[20000:25000])
+        self.assertEqualIgnoreOrder(page_fetchers[5].all_data(), expected_data[:5000])
+        self.assertEqualIgnoreOrder(page_fetchers[6].all_data(), expected_data[5000:10000])
+        self.assertEqualIgnoreOrder(page_fetchers[7].all_data(), expected_data[10000:15000])
+        self.assertEqualIgnoreOrder(page_fetchers[8].all_data(), expected_data[15000:20000])
+        self.assertEqualIgnoreOrder(page_fetchers[9].all_data(), expected_data[20000:25000])
+        self.assertEqualIgnoreOrder(page_fetchers[10].all_data(), expected_data[:50000])
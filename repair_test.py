@@ -2,7 +2,7 @@ import time, re
 from dtest import Tester, debug
 from cassandra import ConsistencyLevel
 from cassandra.query import SimpleStatement
-from tools import no_vnodes, insert_c1c2, query_c1c2
+from tools import no_vnodes, insert_c1c2, query_c1c2, insert_c1c2_range
 
 class TestRepair(Tester):
 
@@ -55,14 +55,12 @@ class TestRepair(Tester):
 
         # Insert 1000 keys, kill node 3, insert 1 key, restart node 3, insert 1000 more keys
         debug("Inserting data...")
-        for i in xrange(0, 1000):
-            insert_c1c2(cursor, i, ConsistencyLevel.ALL)
+        self.assertEqual({}, insert_c1c2_range(cursor, xrange(0, 1000), ConsistencyLevel.ALL))
         node3.flush()
         node3.stop()
         insert_c1c2(cursor, 1000, ConsistencyLevel.TWO)
         node3.start(wait_other_notice=True)
-        for i in xrange(1001, 2001):
-            insert_c1c2(cursor, i, ConsistencyLevel.ALL)
+        self.assertEqual({}, insert_c1c2_range(cursor, xrange(1001, 2001), ConsistencyLevel.ALL))
 
         cluster.flush()
 
@@ -1,4 +1,5 @@
 from dtest import Tester, debug, DISABLE_VNODES
+from tools import quick_stress
 import unittest
 from ccmlib.cluster import Cluster
 from ccmlib.node import Node, NodeError, TimeoutError
@@ -44,14 +45,11 @@ class TestReplaceAddress(Tester):
         debug(numNodes)
 
         debug("Inserting Data...")
-        if cluster.version() < "2.1":
-            node1.stress(['-o', 'insert', '--num-keys=10000', '--replication-factor=3'])
-        else:
-            node1.stress(['write', 'n=10000', '-schema', 'replication(factor=3)'])
+        quick_stress(node1, n=10000, rf=3)
 
         cursor = self.patient_cql_connection(node1)
         cursor.default_timeout = 45
-        stress_table = 'keyspace1.standard1' if self.cluster.version() >= '2.1' else '"Keyspace1"."Standard1"'
+        stress_table = 'keyspace1.standard1'
         query = SimpleStatement('select * from %s LIMIT 1' % stress_table, consistency_level=ConsistencyLevel.THREE)
         initialData = cursor.execute(query)
 
@@ -99,12 +97,9 @@ class TestReplaceAddress(Tester):
         [node1,node2, node3] = cluster.nodelist()
 
         debug("Inserting Data...")
-        if cluster.version() < "2.1":
-            node1.stress(['-o', 'insert', '--num-keys=10000', '--replication-factor=3'])
-        else:
-            node1.stress(['write', 'n=10000', '-schema', 'replication(factor=3)'])
+        quick_stress(node1, n=10000, rf=3)
         cursor = self.patient_cql_connection(node1)
-        stress_table = 'keyspace1.standard1' if self.cluster.version() >= '2.1' else '"Keyspace1"."Standard1"'
+        stress_table = 'keyspace1.standard1'
         query = SimpleStatement('select * from %s LIMIT 1' % stress_table, consistency_level=ConsistencyLevel.THREE)
         initialData = cursor.execute(query)
 
@@ -129,12 +124,9 @@ class TestReplaceAddress(Tester):
         [node1,node2, node3] = cluster.nodelist()
 
         debug("Inserting Data...")
-        if cluster.version() < "2.1":
-            node1.stress(['-o', 'insert', '--num-keys=10000', '--replication-factor=3'])
-        else:
-            node1.stress(['write', 'n=10000', '-schema', 'replication(factor=3)'])
+        quick_stress(node1, n=10000, rf=3)
         cursor = self.patient_cql_connection(node1)
-        stress_table = 'keyspace1.standard1' if self.cluster.version() >= '2.1' else '"Keyspace1"."Standard1"'
+        stress_table = 'keyspace1.standard1'
         query = SimpleStatement('select * from %s LIMIT 1' % stress_table, consistency_level=ConsistencyLevel.THREE)
         initialData = cursor.execute(query)
 
@@ -165,13 +157,10 @@ class TestReplaceAddress(Tester):
         debug(numNodes)
 
         debug("Inserting Data...")
-        if cluster.version() < "2.1":
-            node1.stress(['-o', 'insert', '--num-keys=10000', '--replication-factor=3'])
-        else:
-            node1.stress(['write', 'n=10000', '-schema', 'replication(factor=3)'])
+        quick_stress(node1, n=10000, rf=3)
 
         cursor = self.patient_cql_connection(node1)
-        stress_table = 'keyspace1.standard1' if self.cluster.version() >= '2.1' else '"Keyspace1"."Standard1"'
+        stress_table = 'keyspace1.standard1'
         query = SimpleStatement('select * from %s LIMIT 1' % stress_table, consistency_level=ConsistencyLevel.THREE)
         initialData = cursor.execute(query)
 
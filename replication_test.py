@@ -1,7 +1,7 @@
 from dtest import Tester, debug, PRINT_DEBUG
-from tools import no_vnodes
+from tools import no_vnodes, murmur3_token, murmur3_tokens
 from ccmlib.cluster import Cluster
-import re, os, time
+import re, os, time, struct, unittest
 from collections import defaultdict
 from cassandra.query import SimpleStatement
 from cassandra import ConsistencyLevel
@@ -12,8 +12,8 @@ TRACE_RESPOND_MESSAGE = re.compile('Message received from /([0-9]+\.[0-9]+\.[0-9
 TRACE_COMMIT_LOG = re.compile('Appending to commitlog')
 TRACE_FORWARD_WRITE = re.compile('Enqueuing forwarded write to /([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)')
 
-# Some pre-computed murmur 3 hashes; there are no good python murmur3
-# hashing libraries :(
+# Some pre-computed murmur 3 hashes, as given by Cassandra's Murmur3Partitioner
+# to the int keys the tests write
 murmur3_hashes = {
     5: -7509452495886106294,
     10: -6715243485458697746,
@@ -38,6 +38,28 @@ murmur3_hashes = {
 }
 
 
+class Murmur3TokenTest(unittest.TestCase):
+    """Checks tools' murmur3 token calculators against the tokens Cassandra
+    gave, without any cluster."""
+    def murmur3_token_test(self):
+        for key, token in murmur3_hashes.items():
+            self.assertEqual(token, murmur3_token(struct.pack('>i', key)), "token of %d" % key)
+        self.assertEqual(-2**63, murmur3_token(''))
+
+    def murmur3_tokens_test(self):
+        """Check the numpy murmur3_tokens against the table, and against
+        murmur3_token for every tail length over 2 blocks"""
+        keys = sorted(murmur3_hashes)
+        try:
+            tokens = murmur3_tokens(struct.pack('>i', key) for key in keys)
+        except ImportError:
+            self.skipTest('murmur3_tokens needs numpy')
+        self.assertEqual([murmur3_hashes[key] for key in keys], list(tokens))
+
+        keys = ['\xff' * n for n in xrange(0, 40)]
+        self.assertEqual([murmur3_token(key) for key in keys], list(murmur3_tokens(keys)))
+
+
 @no_vnodes()
 class ReplicationTest(Tester):
     """This test suite looks at how data is replicated across a cluster
@@ -1,5 +1,6 @@
 from dtest import Tester, debug
 from tools import replace_in_file, since
+from assertions import assert_row_count_streaming
 import tempfile, shutil, glob, os, time
 import distutils.dir_util
 
@@ -184,9 +185,8 @@ class TestArchiveCommitlog(SnapshotTester):
             # Record when the third set of inserts finished:
             insert_cutoff_times.append(time.gmtime())
 
-            rows = cursor.execute('SELECT count(*) from ks.cf')
             # Make sure we have the same amount of rows as when we snapshotted:
-            self.assertEqual(rows[0][0], 65000)
+            assert_row_count_streaming(cursor, 'ks.cf', 65000)
 
             # Check that there are at least one commit log backed up that
             # is not one of the active commit logs:
@@ -224,9 +224,8 @@ class TestArchiveCommitlog(SnapshotTester):
             cursor = self.patient_cql_connection(node1)
             node1.nodetool('refresh ks cf')
 
-            rows = cursor.execute('SELECT count(*) from ks.cf')
             # Make sure we have the same amount of rows as when we snapshotted:
-            self.assertEqual(rows[0][0], 30000)
+            assert_row_count_streaming(cursor, 'ks.cf', 30000)
 
             # Edit commitlog_archiving.properties. Remove the archive
             # command  and set a restore command and restore_directories:
@@ -250,15 +249,14 @@ class TestArchiveCommitlog(SnapshotTester):
             node1.nodetool('compact')
 
             cursor = self.patient_cql_connection(node1)
-            rows = cursor.execute('SELECT count(*) from ks.cf')
             # Now we should have 30000 rows from the snapshot + 30000 rows
             # from the commitlog backups:
             if not restore_archived_commitlog:
-                self.assertEqual(rows[0][0], 30000)
+                assert_row_count_streaming(cursor, 'ks.cf', 30000)
             elif restore_point_in_time:
-                self.assertEqual(rows[0][0], 60000)
+                assert_row_count_streaming(cursor, 'ks.cf', 60000)
             else:
-                self.assertEqual(rows[0][0], 65000)
+                assert_row_count_streaming(cursor, 'ks.cf', 65000)
 
         finally:
             # clean up
@@ -2,7 +2,7 @@ import time, os
 from distutils import dir_util
 import subprocess
 
-from dtest import Tester, debug
+from dtest import Tester, debug, wait_for_flushes
 from ccmlib import common as ccmcommon
 
 class TestSSTableGenerationAndLoading(Tester):
@@ -41,7 +41,7 @@ class TestSSTableGenerationAndLoading(Tester):
         rnd.close()
 
         node1.flush()
-        time.sleep(2)
+        wait_for_flushes(node1)
         rows = cursor.execute("SELECT * FROM cf WHERE KEY = '0' AND c < '8'")
         assert len(rows) > 0
 
@@ -56,7 +56,7 @@ class TestSSTableGenerationAndLoading(Tester):
 
         # Makinge sure the cluster is ready to accept the subsequent
         # stress connection. This was an issue on Windows.
-        node1.watch_log_for('thrift clients...')
+        self.log_watcher.wait_for(node1, 'thrift clients...')
         version = cluster.version()
         if version < "2.1":
             node1.stress(['--num-keys=10000'])
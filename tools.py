@@ -1,12 +1,20 @@
 from ccmlib.node import Node
 from decorator  import decorator
 from distutils.version import LooseVersion
-import re, os, sys, fileinput, time, unittest, functools
+import re, os, sys, fileinput, time, unittest, functools, hashlib, struct
 
-from cassandra import ConsistencyLevel
+try:
+    import numpy
+except ImportError:
+    # only needed by murmur3_tokens
+    numpy = None
+
+from cassandra import ConsistencyLevel, AlreadyExists
+from cassandra.cluster import Cluster as PyCluster
+from cassandra.concurrent import execute_concurrent_with_args
 from cassandra.query import SimpleStatement
 
-from dtest import Tester, DISABLE_VNODES
+from dtest import Tester, DISABLE_VNODES, NO_SKIP, cluster_lease, cassandra_version
 
 def rows_to_list(rows):
     new_list = [list(row) for row in rows]
@@ -22,22 +30,62 @@ def insert_c1c2(session, key, consistency=ConsistencyLevel.QUORUM):
 def query_c1c2(session, key, consistency=ConsistencyLevel.QUORUM):
     query = SimpleStatement('SELECT c1, c2 FROM cf WHERE key=\'k%d\'' % key, consistency_level=consistency)
     rows = session.execute(query)
+    _validate_c1c2(rows)
+
+def _validate_c1c2(rows):
     assert len(rows) == 1
     res = rows[0]
     assert len(res) == 2 and res[0] == 'value1' and res[1] == 'value2', res
 
+def _execute_c1c2_range(session, query, keys, consistency, concurrency):
+    """Prepares query once and runs it for each of keys, concurrency at a time.
+    Returns (key, (success, result or exception)) pairs."""
+    keys = list(keys)
+    statement = session.prepare(query)
+    statement.consistency_level = consistency
+    results = execute_concurrent_with_args(session, statement, [('k%d' % key,) for key in keys],
+                                           concurrency=concurrency, raise_on_first_error=False)
+    return zip(keys, results)
+
+def insert_c1c2_range(session, keys, consistency=ConsistencyLevel.QUORUM, concurrency=100):
+    """Does insert_c1c2 for every key in keys, with a single prepared
+    statement pipelined concurrency at a time. Returns a dict of the keys
+    that failed to the exception they failed with."""
+    results = _execute_c1c2_range(session, "UPDATE cf SET c1='value1', c2='value2' WHERE key=?",
+                                  keys, consistency, concurrency)
+    return dict((key, result) for key, (success, result) in results if not success)
+
+def query_c1c2_range(session, keys, consistency=ConsistencyLevel.QUORUM, concurrency=100):
+    """Does query_c1c2 for every key in keys, like insert_c1c2_range. Keys
+    that did not read back as expected fail with an AssertionError."""
+    failures = {}
+    results = _execute_c1c2_range(session, "SELECT c1, c2 FROM cf WHERE key=?",
+                                  keys, consistency, concurrency)
+    for key, (success, result) in results:
+        if success:
+            try:
+                _validate_c1c2(result)
+            except AssertionError, e:
+                failures[key] = e
+        else:
+            failures[key] = result
+    return failures
+
 # work for cluster started by populate
-def new_node(cluster, bootstrap=True, token=None, remote_debug_port='2000', data_center=None):
+def new_node(cluster, bootstrap=True, token=None, remote_debug_port=None, data_center=None):
     i = len(cluster.nodes) + 1
+    lease = cluster_lease()
+    if remote_debug_port is None:
+        remote_debug_port = lease.remote_debug_port(i)
     node = Node('node%s' % i,
                 cluster,
                 bootstrap,
-                ('127.0.0.%s' % i, 9160),
-                ('127.0.0.%s' % i, 7000),
-                str(7000 + i * 100),
+                (lease.address(i), 9160),
+                (lease.address(i), 7000),
+                lease.jmx_port(i),
                 remote_debug_port,
                 token,
-                binary_interface=('127.0.0.%s' % i, 9042))
+                binary_interface=(lease.address(i), 9042))
     cluster.add(node, not bootstrap, data_center=data_center)
     return node
 
@@ -54,6 +102,227 @@ def query_columns(tester, cursor, key, columns_count, consistency=ConsistencyLev
     for i in xrange(0, columns_count):
         assert res[i][1] == 'value%d' % (i+offset)
 
+def quick_stress(node, n=10000, rf=1, consistency=ConsistencyLevel.ONE, concurrency=100, columns=5, value_size=34):
+    """Writes n rows to keyspace1.standard1 through node, like
+    `cassandra-stress write` does, creating the keyspace with replication
+    factor rf and the table if they don't exist yet.
+
+    Rows are written from this process with one prepared INSERT pipelined
+    concurrency at a time, so there is no JVM to start, and the schema is
+    the same whatever the Cassandra version. Raises the first write error."""
+    version = node.cluster.version()
+    if version >= '2.1':
+        protocol_version = 3
+    elif version >= '2.0':
+        protocol_version = 2
+    else:
+        protocol_version = 1
+
+    host, port = node.network_interfaces['binary']
+    cluster = PyCluster([host], port=port, protocol_version=protocol_version)
+    try:
+        session = cluster.connect()
+        try:
+            session.execute("CREATE KEYSPACE keyspace1 WITH replication = {'class': 'SimpleStrategy', 'replication_factor': %d}" % rf)
+        except AlreadyExists:
+            pass
+        column_names = [ '"C%d"' % i for i in xrange(0, columns) ]
+        try:
+            session.execute('CREATE TABLE keyspace1.standard1 (key blob PRIMARY KEY, %s) WITH COMPACT STORAGE'
+                            % ', '.join('%s blob' % c for c in column_names))
+        except AlreadyExists:
+            pass
+
+        insert = session.prepare('INSERT INTO keyspace1.standard1 (key, %s) VALUES (?, %s)'
+                                 % (', '.join(column_names), ', '.join('?' for c in column_names)))
+        insert.consistency_level = consistency
+        execute_concurrent_with_args(session, insert, (_stress_row(k, columns, value_size) for k in xrange(0, n)),
+                                     concurrency=concurrency)
+    finally:
+        cluster.shutdown()
+
+def _stress_row(key, columns, value_size):
+    # values are derived from the key, so that rewriting a key is idempotent
+    row = [ '%010d' % key ]
+    for i in xrange(0, columns):
+        digest = hashlib.md5('%d:%d' % (key, i)).digest()
+        row.append((digest * (value_size // len(digest) + 1))[:value_size])
+    return row
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_MURMUR3_C1 = 0x87c37b91114253d5
+_MURMUR3_C2 = 0x4cf5ad432745937f
+
+def _rotl64(x, r):
+    return ((x << r) | (x >> (64 - r))) & _MASK64
+
+def _fmix64(k):
+    k ^= k >> 33
+    k = (k * 0xff51afd7ed558ccd) & _MASK64
+    k ^= k >> 33
+    k = (k * 0xc4ceb9fe1a85ec53) & _MASK64
+    k ^= k >> 33
+    return k
+
+def murmur3_token(key):
+    """Returns the token Murmur3Partitioner gives to the partition key whose
+    serialized form is the byte string key (e.g. struct.pack('>i', 1) for
+    int 1).
+
+    This is Cassandra's MurmurHash.hash3_x64_128 with seed 0, which differs
+    from the reference MurmurHash3 in that the bytes of the last, partial
+    block are sign-extended. Like the partitioner, it gives the empty key
+    the minimum token, Long.MIN_VALUE, and turns any other key hashing to
+    Long.MIN_VALUE into Long.MAX_VALUE."""
+    length = len(key)
+    if length == 0:
+        return -(1 << 63)
+    nblocks = length // 16
+    h1 = h2 = 0
+
+    for i in xrange(0, nblocks):
+        k1, k2 = struct.unpack_from('<QQ', key, i * 16)
+
+        k1 = (k1 * _MURMUR3_C1) & _MASK64
+        k1 = _rotl64(k1, 31)
+        k1 = (k1 * _MURMUR3_C2) & _MASK64
+        h1 ^= k1
+        h1 = _rotl64(h1, 27)
+        h1 = (h1 + h2) & _MASK64
+        h1 = (h1 * 5 + 0x52dce729) & _MASK64
+
+        k2 = (k2 * _MURMUR3_C2) & _MASK64
+        k2 = _rotl64(k2, 33)
+        k2 = (k2 * _MURMUR3_C1) & _MASK64
+        h2 ^= k2
+        h2 = _rotl64(h2, 31)
+        h2 = (h2 + h1) & _MASK64
+        h2 = (h2 * 5 + 0x38495ab5) & _MASK64
+
+    tail = struct.unpack_from('%db' % (length % 16), key, nblocks * 16)
+    k1 = k2 = 0
+    for i, b in enumerate(tail):
+        if i < 8:
+            k1 ^= (b << (8 * i)) & _MASK64
+        else:
+            k2 ^= (b << (8 * (i - 8))) & _MASK64
+    if len(tail) > 8:
+        k2 = (k2 * _MURMUR3_C2) & _MASK64
+        k2 = _rotl64(k2, 33)
+        k2 = (k2 * _MURMUR3_C1) & _MASK64
+        h2 ^= k2
+    if len(tail) > 0:
+        k1 = (k1 * _MURMUR3_C1) & _MASK64
+        k1 = _rotl64(k1, 31)
+        k1 = (k1 * _MURMUR3_C2) & _MASK64
+        h1 ^= k1
+
+    h1 ^= length
+    h2 ^= length
+    h1 = (h1 + h2) & _MASK64
+    h2 = (h2 + h1) & _MASK64
+    h1 = _fmix64(h1)
+    h2 = _fmix64(h2)
+    h1 = (h1 + h2) & _MASK64
+
+    if h1 == 1 << 63:
+        # Long.MIN_VALUE is the partitioner's minimum token, not a key's
+        return (1 << 63) - 1
+    return h1 - (1 << 64) if h1 >= 1 << 63 else h1
+
+def murmur3_tokens(keys):
+    """Like murmur3_token for each of keys (so the empty key still gets
+    Long.MIN_VALUE), but vectorized with numpy: keys
+    is either a sequence of byte strings or a 2-dimensional uint8 array
+    holding one key per row. Returns an int64 array of the tokens, in the
+    order of keys."""
+    if numpy is None:
+        raise ImportError('murmur3_tokens needs numpy')
+    if isinstance(keys, numpy.ndarray):
+        return _murmur3_tokens_fixed(keys)
+
+    keys = list(keys)
+    tokens = numpy.empty(len(keys), dtype=numpy.int64)
+    by_length = {}
+    for i, key in enumerate(keys):
+        by_length.setdefault(len(key), []).append(i)
+    for length, indexes in by_length.items():
+        if length == 0:
+            tokens[indexes] = numpy.iinfo(numpy.int64).min
+            continue
+        buf = numpy.frombuffer(''.join(keys[i] for i in indexes), dtype=numpy.uint8)
+        tokens[indexes] = _murmur3_tokens_fixed(buf.reshape(len(indexes), length))
+    return tokens
+
+def _murmur3_tokens_fixed(keys):
+    # keys is an (n, length) uint8 array; every operation is on uint64
+    # arrays or scalars, which wrap around like the java longs do
+    u64 = numpy.uint64
+    c1, c2 = u64(_MURMUR3_C1), u64(_MURMUR3_C2)
+
+    def rotl(x, r):
+        return (x << u64(r)) | (x >> u64(64 - r))
+
+    def fmix(k):
+        k ^= k >> u64(33)
+        k *= u64(0xff51afd7ed558ccd)
+        k ^= k >> u64(33)
+        k *= u64(0xc4ceb9fe1a85ec53)
+        k ^= k >> u64(33)
+        return k
+
+    keys = numpy.ascontiguousarray(keys, dtype=numpy.uint8)
+    n, length = keys.shape
+    nblocks = length // 16
+    h1 = numpy.zeros(n, dtype=numpy.uint64)
+    h2 = numpy.zeros(n, dtype=numpy.uint64)
+
+    if nblocks:
+        blocks = keys[:, :nblocks * 16].copy().view('<u8').astype(numpy.uint64)
+        for i in xrange(0, nblocks):
+            k1 = blocks[:, 2 * i] * c1
+            k1 = rotl(k1, 31) * c2
+            h1 ^= k1
+            h1 = rotl(h1, 27) + h2
+            h1 = h1 * u64(5) + u64(0x52dce729)
+
+            k2 = blocks[:, 2 * i + 1] * c2
+            k2 = rotl(k2, 33) * c1
+            h2 ^= k2
+            h2 = rotl(h2, 31) + h1
+            h2 = h2 * u64(5) + u64(0x38495ab5)
+
+    # sign-extend the tail bytes, like java does with the bytes it reads
+    tail = keys[:, nblocks * 16:].view(numpy.int8).astype(numpy.int64).view(numpy.uint64)
+    k1 = numpy.zeros(n, dtype=numpy.uint64)
+    k2 = numpy.zeros(n, dtype=numpy.uint64)
+    for i in xrange(0, tail.shape[1]):
+        if i < 8:
+            k1 ^= tail[:, i] << u64(8 * i)
+        else:
+            k2 ^= tail[:, i] << u64(8 * (i - 8))
+    if tail.shape[1] > 8:
+        k2 = rotl(k2 * c2, 33) * c1
+        h2 ^= k2
+    if tail.shape[1] > 0:
+        k1 = rotl(k1 * c1, 31) * c2
+        h1 ^= k1
+
+    h1 ^= u64(length)
+    h2 ^= u64(length)
+    h1 += h2
+    h2 += h1
+    h1 = fmix(h1)
+    h2 = fmix(h2)
+    h1 += h2
+
+    tokens = h1.view(numpy.int64)
+    if length == 0:
+        tokens[:] = numpy.iinfo(numpy.int64).min
+    else:
+        tokens[tokens == numpy.iinfo(numpy.int64).min] = numpy.iinfo(numpy.int64).max
+    return tokens
+
 def retry_till_success(fun, *args, **kwargs):
     timeout = kwargs.pop('timeout', 60)
     bypassed_exception = kwargs.pop('bypassed_exception', Exception)
@@ -90,24 +359,13 @@ def putget(cluster, cursor, cl=ConsistencyLevel.QUORUM):
     _validate_row(cluster, rows)
 
 def _put_with_overwrite(cluster, cursor, nb_keys, cl=ConsistencyLevel.QUORUM):
-    for k in xrange(0, nb_keys):
-        kvs = [ "UPDATE cf SET v=\'value%d\' WHERE key=\'k%s\' AND c=\'c%02d\'" % (i, k, i) for i in xrange(0, 100) ]
-        query = SimpleStatement('BEGIN BATCH %s APPLY BATCH' % '; '.join(kvs), consistency_level=cl)
-        cursor.execute(query)
-        time.sleep(.01)
-    cluster.flush()
-    for k in xrange(0, nb_keys):
-        kvs = [ "UPDATE cf SET v=\'value%d\' WHERE key=\'k%s\' AND c=\'c%02d\'" % (i*4, k, i*2) for i in xrange(0, 50) ]
-        query = SimpleStatement('BEGIN BATCH %s APPLY BATCH' % '; '.join(kvs), consistency_level=cl)
-        cursor.execute(query)
-        time.sleep(.01)
-    cluster.flush()
-    for k in xrange(0, nb_keys):
-        kvs = [ "UPDATE cf SET v=\'value%d\' WHERE key=\'k%s\' AND c=\'c%02d\'" % (i*20, k, i*5) for i in xrange(0, 20) ]
-        query = SimpleStatement('BEGIN BATCH %s APPLY BATCH' % '; '.join(kvs), consistency_level=cl)
-        cursor.execute(query)
-        time.sleep(.01)
-    cluster.flush()
+    update = cursor.prepare("UPDATE cf SET v=? WHERE key=? AND c=?")
+    update.consistency_level = cl
+    # each pass overwrites some of the columns of the one before, then flushes
+    for columns, value_step, column_step in ((100, 1, 1), (50, 4, 2), (20, 20, 5)):
+        kvs = [ ('value%d' % (i*value_step), 'k%s' % k, 'c%02d' % (i*column_step)) for k in xrange(0, nb_keys) for i in xrange(0, columns) ]
+        execute_concurrent_with_args(cursor, update, kvs, concurrency=100)
+        cluster.flush()
 
 def _validate_row(cluster, res):
     assert len(res) == 100, len(res)
@@ -190,6 +448,14 @@ class since(object):
         return wrapped
 
     def __call__(self, skippable):
+        version = cassandra_version()
+        if version is not None:
+            # known up front: skip like unittest.skip does, before setUp
+            # has created any cluster
+            msg = self._skip_msg(version)
+            if msg and not NO_SKIP:
+                return unittest.skip(msg)(skippable)
+            return skippable
         if isinstance(skippable, type):
             return self._wrap_setUp(skippable)
         return self._wrap_function(skippable)
@@ -1,5 +1,5 @@
-from dtest import Tester
-from tools import insert_c1c2, query_c1c2, no_vnodes, new_node
+from dtest import Tester, wait_for_compactions
+from tools import insert_c1c2_range, query_c1c2_range, no_vnodes, new_node
 from assertions import assert_almost_equal
 
 import os, sys, time
@@ -9,6 +9,12 @@ from cassandra import ConsistencyLevel
 @no_vnodes()
 class TestTopology(Tester):
 
+    def _wait_for_compactions(self):
+        """ waits for the cleanups and compactions of the running nodes """
+        for node in self.cluster.nodelist():
+            if node.is_running():
+                wait_for_compactions(node)
+
     def movement_test(self):
         cluster = self.cluster
 
@@ -20,8 +26,7 @@ class TestTopology(Tester):
         self.create_ks(cursor, 'ks', 1)
         self.create_cf(cursor, 'cf', columns={'c1': 'text', 'c2': 'text'})
 
-        for n in xrange(0, 10000):
-            insert_c1c2(cursor, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, insert_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.ONE))
 
         cluster.flush()
 
@@ -38,8 +43,7 @@ class TestTopology(Tester):
         cluster.cleanup()
 
         # Check we can get all the keys
-        for n in xrange(0, 10000):
-            query_c1c2(cursor, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, query_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.ONE))
 
         # Now the load should be basically even
         sizes = [ node.data_size() for node in [node1, node2, node3] ]
@@ -59,8 +63,7 @@ class TestTopology(Tester):
         self.create_ks(cursor, 'ks', 2)
         self.create_cf(cursor, 'cf',columns={'c1': 'text', 'c2': 'text'})
 
-        for n in xrange(0, 10000):
-            insert_c1c2(cursor, n, ConsistencyLevel.QUORUM)
+        self.assertEqual({}, insert_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.QUORUM))
 
         cluster.flush()
         sizes = [ node.data_size() for node in cluster.nodelist() if node.is_running()]
@@ -71,11 +74,10 @@ class TestTopology(Tester):
         node4.decommission()
         node4.stop()
         cluster.cleanup()
-        time.sleep(.5)
+        self._wait_for_compactions()
 
         # Check we can get all the keys
-        for n in xrange(0, 10000):
-            query_c1c2(cursor, n, ConsistencyLevel.QUORUM)
+        self.assertEqual({}, query_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.QUORUM))
 
         sizes = [ node.data_size() for node in cluster.nodelist() if node.is_running() ]
         three_node_sizes = sizes
@@ -88,11 +90,10 @@ class TestTopology(Tester):
             node1.removeToken(tokens[2])
             time.sleep(.5)
             cluster.cleanup()
-            time.sleep(.5)
+            self._wait_for_compactions()
 
             # Check we can get all the keys
-            for n in xrange(0, 10000):
-                query_c1c2(cursor, n, ConsistencyLevel.QUORUM)
+            self.assertEqual({}, query_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.QUORUM))
 
             sizes = [ node.data_size() for node in cluster.nodelist() if node.is_running() ]
             assert_almost_equal(*sizes)
@@ -101,13 +102,12 @@ class TestTopology(Tester):
             node5 = new_node(cluster, token=(tokens[2]+1)).start()
             time.sleep(.5)
             cluster.cleanup()
-            time.sleep(.5)
+            self._wait_for_compactions()
             cluster.compact()
-            time.sleep(.5)
+            self._wait_for_compactions()
 
             # Check we can get all the keys
-            for n in xrange(0, 10000):
-                query_c1c2(cursor, n, ConsistencyLevel.QUORUM)
+            self.assertEqual({}, query_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.QUORUM))
 
             sizes = [ node.data_size() for node in cluster.nodelist() if node.is_running() ]
             # We should be back to the earlir 3 nodes situation
@@ -127,8 +127,7 @@ class TestTopology(Tester):
         self.create_ks(cursor, 'ks', 1)
         self.create_cf(cursor, 'cf', columns={'c1': 'text', 'c2': 'text'})
 
-        for n in xrange(0, 10000):
-            insert_c1c2(cursor, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, insert_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.ONE))
 
         cluster.flush()
 
@@ -138,5 +137,4 @@ class TestTopology(Tester):
         cluster.cleanup()
 
         # Check we can get all the keys
-        for n in xrange(0, 10000):
-            query_c1c2(cursor, n, ConsistencyLevel.ONE)
+        self.assertEqual({}, query_c1c2_range(cursor, xrange(0, 10000), ConsistencyLevel.ONE))
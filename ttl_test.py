@@ -380,12 +380,12 @@ class TestDistributedTTL(Tester):
         time.sleep(3.5)
         self.node1.stop()
         self.node2.start()
-        self.node2.watch_log_for("Listening for thrift clients...")
+        self.log_watcher.wait_for(self.node2, "Listening for thrift clients...")
         cursor2 = self.patient_exclusive_cql_connection(self.node2)
         cursor2.execute("USE ks;")
         assert_row_count(cursor2, 'ttl_table', 0)  # should be 0 since node1 is down, no replica yet
         self.node1.start()
-        self.node1.watch_log_for("Listening for thrift clients...")
+        self.log_watcher.wait_for(self.node1, "Listening for thrift clients...")
         self.cursor1 = self.patient_exclusive_cql_connection(self.node1)
         self.cursor1.execute("USE ks;")
         self.node1.cleanup()
@@ -430,7 +430,7 @@ class TestDistributedTTL(Tester):
         cursor2.execute("USE ks;")
         assert_unavailable(cursor2.execute, "SELECT * FROM ttl_table;")
         self.node1.start()
-        self.node1.watch_log_for("Listening for thrift clients...")
+        self.log_watcher.wait_for(self.node1, "Listening for thrift clients...")
         self.cursor1 = self.patient_exclusive_cql_connection(self.node1)
         self.cursor1.execute("USE ks;")
         self.cursor1.execute("""
@@ -110,7 +110,7 @@ class TestSCUpgrade(Tester):
             time.sleep(.5)
         else:
             node1.drain()
-            node1.watch_log_for("DRAINED")
+            self.log_watcher.wait_for(node1, "DRAINED")
             node1.stop(wait_other_notice=False)
             self.set_node_to_current_version(node1)
             node1.start(wait_other_notice=True)
@@ -144,8 +144,8 @@ class TestSCUpgrade(Tester):
         else:
             node2.drain()
             node3.drain()
-            node2.watch_log_for("DRAINED")
-            node3.watch_log_for("DRAINED")
+            self.log_watcher.wait_for(node2, "DRAINED")
+            self.log_watcher.wait_for(node3, "DRAINED")
             node2.stop(wait_other_notice=False)
             node3.stop(wait_other_notice=False)
             self.set_node_to_current_version(node2)
@@ -179,7 +179,7 @@ class TestSCUpgrade(Tester):
         for node in nodes:
             debug('Shutting down node: ' + node.name)
             node.drain()
-            node.watch_log_for("DRAINED")
+            self.log_watcher.wait_for(node, "DRAINED")
             node.stop(wait_other_notice=False)
 
         # Update Cassandra Directory
@@ -9,7 +9,7 @@ import uuid
 
 from collections import defaultdict
 from distutils.version import LooseVersion
-from dtest import Tester, debug, DISABLE_VNODES, DEFAULT_DIR
+from dtest import Tester, debug, DISABLE_VNODES, DEFAULT_DIR, wait_for_gossip_normal, wait_for_schema_agreement
 from tools import new_node
 from ccmlib import common as ccmcommon
 import tarfile
@@ -193,7 +193,8 @@ class TestUpgradeThroughVersions(Tester):
             self._create_schema()
         else:
             debug("Skipping schema creation (should already be built)")
-        time.sleep(5)  # sigh...
+        wait_for_gossip_normal(cluster)
+        wait_for_schema_agreement(self.node1)
 
         self._log_current_ver(self.test_versions[0])
 
@@ -246,7 +247,7 @@ class TestUpgradeThroughVersions(Tester):
         for node in nodes:
             debug('Shutting down node: ' + node.name)
             node.drain()
-            node.watch_log_for("DRAINED")
+            self.log_watcher.wait_for(node, "DRAINED")
             node.stop(wait_other_notice=False)
 
         # Update source or get a new version
@@ -287,7 +288,7 @@ class TestUpgradeThroughVersions(Tester):
                 vers[:curr_index] + ['***' + current_tag + '***'] + vers[curr_index + 1:]))
 
     def _create_schema(self):
-        cursor = self.patient_cql_connection(self.node2, version="3.0.0", protocol_version=1)
+        cursor = self.cached_cql_connection(self.node2, version="3.0.0", protocol_version=1)
 
         cursor.execute("""CREATE KEYSPACE upgrade WITH replication = {'class':'SimpleStrategy',
             'replication_factor':2};
@@ -306,8 +307,7 @@ class TestUpgradeThroughVersions(Tester):
                 );""")
 
     def _write_values(self, num=100):
-        cursor = self.patient_cql_connection(self.node2, protocol_version=1)
-        cursor.execute("use upgrade")
+        cursor = self.cached_cql_connection(self.node2, keyspace='upgrade', protocol_version=1)
         for i in xrange(num):
             x = len(self.row_values) + 1
             cursor.execute("UPDATE cf SET v='%d' WHERE k=%d" % (x, x))
@@ -315,8 +315,7 @@ class TestUpgradeThroughVersions(Tester):
 
     def _check_values(self, consistency_level=ConsistencyLevel.ALL):
         for node in self.cluster.nodelist():
-            cursor = self.patient_cql_connection(node, protocol_version=1)
-            cursor.execute("use upgrade")
+            cursor = self.cached_cql_connection(node, keyspace='upgrade', protocol_version=1)
             for x in self.row_values:
                 query = SimpleStatement("SELECT k,v FROM cf WHERE k=%d" % x, consistency_level=consistency_level)
                 result = cursor.execute(query)
@@ -326,8 +325,7 @@ class TestUpgradeThroughVersions(Tester):
 
     def _increment_counters(self, opcount=25000):
         debug("performing {opcount} counter increments".format(opcount=opcount))
-        cursor = self.patient_cql_connection(self.node2, version="3.0.0", protocol_version=1)
-        cursor.execute("use upgrade;")
+        cursor = self.cached_cql_connection(self.node2, keyspace='upgrade', version="3.0.0", protocol_version=1)
 
         update_counter_query = ("UPDATE countertable SET c = c + 1 WHERE k1='{key1}' and k2={key2}")
 
@@ -354,8 +352,7 @@ class TestUpgradeThroughVersions(Tester):
 
     def _check_counters(self):
         debug("Checking counter values...")
-        cursor = self.patient_cql_connection(self.node2, version="3.0.0", protocol_version=1)
-        cursor.execute("use upgrade;")
+        cursor = self.cached_cql_connection(self.node2, keyspace='upgrade', version="3.0.0", protocol_version=1)
 
         for key1 in self.expected_counts.keys():
             for key2 in self.expected_counts[key1].keys():
@@ -420,7 +417,7 @@ class PointToPointUpgradeBase(TestUpgradeThroughVersions):
     def _bootstrap_new_node(self):
         # Check we can bootstrap a new node on the upgraded cluster:
         debug("Adding a node to the cluster")
-        nnode = new_node(self.cluster, remote_debug_port=str(2000 + len(self.cluster.nodes)))
+        nnode = new_node(self.cluster)
         nnode.start(use_jna=True, wait_other_notice=True)
         self._write_values()
         self._increment_counters()
@@ -430,7 +427,7 @@ class PointToPointUpgradeBase(TestUpgradeThroughVersions):
     def _bootstrap_new_node_multidc(self):
         # Check we can bootstrap a new node on the upgraded cluster:
         debug("Adding a node to the cluster")
-        nnode = new_node(self.cluster, remote_debug_port=str(2000 + len(self.cluster.nodes)), data_center='dc2')
+        nnode = new_node(self.cluster, data_center='dc2')
 
         nnode.start(use_jna=True, wait_other_notice=True)
         self._write_values()